@@ -2,18 +2,55 @@
 API initialization.
 """
 
+from contextlib import asynccontextmanager
+
+import httpx
 from fastapi import FastAPI
-from config.config import Config
+from config.config import CONFIG
+from app.core.llm_service import LLMService
+from app.core.embedding_service import EmbeddingService
+from app.services.agent_service import AgentService
+from app.services.memory_storage import RedisMemoryStorage
 from app.api.routes import router as agent_router
+from app.api.responses import ORJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the shared agent service once per worker and close it on shutdown"""
+    # HTTP/2 multiplexes concurrent completions over a few long-lived connections
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=100),
+        timeout=60.0
+    )
+    llm_service = LLMService(http_client=http_client)
+    llm_service.enable_batching(
+        max_latency_ms=CONFIG.LLM_BATCH_LATENCY_MS,
+        max_concurrency=CONFIG.LLM_MAX_CONCURRENCY
+    )
+    embedding_service = EmbeddingService(CONFIG.EMBEDDING_MODEL) if CONFIG.EMBEDDING_MODEL else None
+    memory_storage = RedisMemoryStorage(CONFIG.REDIS_URL) if CONFIG.REDIS_URL else None
+    app.state.agent_service = AgentService(
+        llm_service=llm_service,
+        embedding_service=embedding_service,
+        memory_storage=memory_storage,
+        compact_every=CONFIG.MEMORY_COMPACT_EVERY,
+        max_memories=CONFIG.MEMORY_MAX_ITEMS,
+        memory_half_life_days=CONFIG.MEMORY_HALF_LIFE_DAYS
+    )
+    yield
+    await app.state.agent_service.aclose()
 
 app = FastAPI(
     title="Letta-like Agent OS",
     description="A memory-powered agent operating system inspired by Letta",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add API prefix from config
-app.include_router(agent_router, prefix=Config.API_PREFIX)
+app.include_router(agent_router, prefix=CONFIG.API_PREFIX)
 
 @app.get("/")
 async def root():
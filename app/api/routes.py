@@ -2,83 +2,101 @@
 API routes for the agent system.
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import AsyncIterator
 
 from app.services.agent_service import AgentService
+from app.api.responses import ORJSONResponse
 
 router = APIRouter()
-agent_service = AgentService()
 
-# Request/Response Models
-class CreateAgentRequest(BaseModel):
-    name: str
-    persona: str
+async def get_agent_service(request: Request) -> AgentService:
+    """Dependency returning the agent service built in the app lifespan"""
+    return request.app.state.agent_service
 
-class AgentResponse(BaseModel):
-    agent_id: str
+# Request Models
+# Responses are plain dicts returned as ORJSONResponse, skipping response-model validation
+class CreateAgentRequest(BaseModel):
     name: str
     persona: str
-    created_at: Optional[str] = None
 
 class MessageRequest(BaseModel):
     message: str
 
-class MessageResponse(BaseModel):
-    message: str
-    agent_id: str
-
-@router.post("/agents", response_model=AgentResponse)
-async def create_agent(request: CreateAgentRequest):
+@router.post("/agents")
+async def create_agent(request: CreateAgentRequest, agent_service: AgentService = Depends(get_agent_service)):
     """Create a new agent"""
     agent = agent_service.create_agent(request.name, request.persona)
-    agent_service.create_default_tools(agent.agent_id)
+    await agent_service.create_default_tools(agent.agent_id)
     
-    return {
+    return ORJSONResponse({
         "agent_id": agent.agent_id,
         "name": agent.name,
-        "persona": agent.persona
-    }
+        "persona": agent.persona,
+        "created_at": None
+    })
 
-@router.get("/agents", response_model=List[AgentResponse])
-async def list_agents():
+@router.get("/agents")
+async def list_agents(agent_service: AgentService = Depends(get_agent_service)):
     """List all available agents"""
-    agents = agent_service.list_agents()
-    return agents
+    agents = await agent_service.list_agents()
+    return ORJSONResponse(agents)
 
-@router.get("/agents/{agent_id}", response_model=AgentResponse)
-async def get_agent(agent_id: str):
+@router.get("/agents/{agent_id}")
+async def get_agent(agent_id: str, agent_service: AgentService = Depends(get_agent_service)):
     """Get a specific agent by ID"""
-    agent = agent_service.get_agent(agent_id)
+    agent = await agent_service.get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail=f"Agent with ID {agent_id} not found")
     
-    return {
+    return ORJSONResponse({
         "agent_id": agent.agent_id,
         "name": agent.name,
-        "persona": agent.persona
-    }
+        "persona": agent.persona,
+        "created_at": None
+    })
 
 @router.delete("/agents/{agent_id}")
-async def delete_agent(agent_id: str):
+async def delete_agent(agent_id: str, agent_service: AgentService = Depends(get_agent_service)):
     """Delete an agent"""
-    success = agent_service.delete_agent(agent_id)
+    success = await agent_service.delete_agent(agent_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"Agent with ID {agent_id} not found")
     
-    return {"message": f"Agent {agent_id} deleted successfully"}
+    return ORJSONResponse({"message": f"Agent {agent_id} deleted successfully"})
 
-@router.post("/agents/{agent_id}/message", response_model=MessageResponse)
-async def send_message(agent_id: str, request: MessageRequest):
+@router.post("/agents/{agent_id}/message")
+async def send_message(agent_id: str, request: MessageRequest, agent_service: AgentService = Depends(get_agent_service)):
     """Send a message to an agent and get a response"""
-    agent = agent_service.get_agent(agent_id)
+    agent = await agent_service.get_agent(agent_id)
     if not agent:
         raise HTTPException(status_code=404, detail=f"Agent with ID {agent_id} not found")
     
-    response = agent_service.generate_response(agent_id, request.message)
+    response = await agent_service.generate_response(agent_id, request.message)
     
-    return {
+    return ORJSONResponse({
         "message": response,
         "agent_id": agent_id
-    } 
\ No newline at end of file
+    })
+
+async def _sse_events(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """Frame response chunks as server-sent events, ending with a [DONE] event"""
+    async for chunk in chunks:
+        yield b"data: " + orjson.dumps({"delta": chunk}) + b"\n\n"
+    yield b"data: [DONE]\n\n"
+
+@router.post("/agents/{agent_id}/message/stream")
+async def stream_message(agent_id: str, request: MessageRequest, agent_service: AgentService = Depends(get_agent_service)):
+    """Send a message to an agent and stream the response as server-sent events"""
+    agent = await agent_service.get_agent(agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail=f"Agent with ID {agent_id} not found")
+    
+    return StreamingResponse(
+        _sse_events(agent_service.stream_response(agent_id, request.message)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
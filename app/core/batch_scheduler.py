@@ -0,0 +1,117 @@
+"""
+Micro-batching scheduler for LLM requests.
+Coalesces concurrent chat completion requests and dispatches them together
+over one shared client, bounding how many are in flight at once.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from openai import AsyncOpenAI
+
+class BatchScheduler:
+    def __init__(self, 
+                 client: AsyncOpenAI,
+                 max_batch: int = 16,
+                 max_latency_ms: float = 10.0,
+                 max_concurrency: int = 32):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            client: Shared OpenAI client that requests are dispatched on
+            max_batch: Maximum number of requests dispatched together
+            max_latency_ms: How long the first request of a batch waits for others to join
+            max_concurrency: Maximum number of requests in flight at once
+        """
+        self.client = client
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._worker: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        # The batch the worker is collecting, taken off the queue but not yet dispatched
+        self._collecting: List[Tuple[Dict, asyncio.Future]] = []
+
+    def start(self) -> None:
+        """Start the batching worker on the running event loop"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the worker and wait for dispatched requests to finish"""
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        
+        # Fail the batch being collected and anything still queued rather than
+        # leaving callers waiting forever
+        pending, self._collecting = self._collecting, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("LLM batch scheduler stopped"))
+
+    async def submit(self, **request: Any) -> Any:
+        """
+        Submit a chat completion request and wait for its result.
+        
+        Args:
+            **request: Keyword arguments for client.chat.completions.create
+            
+        Returns:
+            The completion (or the stream, for stream=True requests)
+        """
+        # Not started: dispatch directly
+        if self._worker is None:
+            return await self.client.chat.completions.create(**request)
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Collect requests into batches and dispatch each batch"""
+        while True:
+            batch = self._collecting = [await self._queue.get()]
+            
+            # Give concurrent requests a short window to join this batch
+            if self._queue.qsize() < self.max_batch - 1:
+                await asyncio.sleep(self.max_latency)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._collecting = []
+            
+            task = asyncio.create_task(self._dispatch_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch_batch(self, batch: List[Tuple[Dict, asyncio.Future]]) -> None:
+        """Dispatch a batch of requests concurrently"""
+        await asyncio.gather(*(self._dispatch(request, future) for request, future in batch))
+
+    async def _dispatch(self, request: Dict, future: asyncio.Future) -> None:
+        """Dispatch one request, resolving its future with the result or error"""
+        # The caller may have given up (e.g. client disconnected) while queued
+        if future.done():
+            return
+        
+        async with self._semaphore:
+            try:
+                result = await self.client.chat.completions.create(**request)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+        
+        if future.done():
+            # Nobody is waiting for this stream any more; release its connection
+            if request.get("stream"):
+                await result.close()
+            return
+        future.set_result(result)
\ No newline at end of file
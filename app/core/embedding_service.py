@@ -0,0 +1,44 @@
+"""
+Core embedding service implementation.
+Turns text into normalized vectors for semantic memory retrieval.
+"""
+
+from typing import List
+
+import numpy as np
+
+class EmbeddingService:
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        """
+        Initialize the embedding service.
+        
+        Args:
+            model_name: Name of the sentence-transformers model to load
+        """
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "Semantic memory retrieval requires sentence-transformers. "
+                "Install it with: pip install sentence-transformers"
+            ) from e
+        
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+        
+        Args:
+            texts: The texts to embed
+            
+        Returns:
+            np.ndarray: float32 matrix of shape (len(texts), dimension) with
+            unit-length rows, so cosine similarity is a plain dot product
+        """
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32, copy=False)
\ No newline at end of file
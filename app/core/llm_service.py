@@ -3,23 +3,63 @@ Core LLM service implementation.
 Handles interactions with the LLM provider (OpenAI).
 """
 
-import os
-from typing import Dict, List, Optional
-from openai import OpenAI
-from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from openai import AsyncOpenAI
+
+from config.config import CONFIG
+from app.core.batch_scheduler import BatchScheduler
 
 class LLMService:
-    def __init__(self):
-        load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API"))
-        self.model = "gpt-3.5-turbo"  # Default model
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        """
+        Initialize the LLM service.
+        
+        Args:
+            http_client: Optional shared HTTP client (connection pool) for the OpenAI client
+        """
+        self.client = AsyncOpenAI(api_key=CONFIG.OPENAI_API_KEY, http_client=http_client)
+        self.model = CONFIG.DEFAULT_MODEL
+        self.scheduler: Optional[BatchScheduler] = None
 
-    def generate_response(self, 
-                         prompt: str, 
-                         system_prompt: Optional[str] = None,
-                         temperature: float = 0.7) -> str:
+    def enable_batching(self, 
+                        max_batch: int = 16,
+                        max_latency_ms: float = 10.0,
+                        max_concurrency: int = 32) -> None:
         """
-        Generate a response from the LLM.
+        Route requests through a micro-batching scheduler on the running event loop.
+        
+        Args:
+            max_batch: Maximum number of requests dispatched together
+            max_latency_ms: How long the first request of a batch waits for others to join
+            max_concurrency: Maximum number of requests in flight at once
+        """
+        self.scheduler = BatchScheduler(
+            self.client,
+            max_batch=max_batch,
+            max_latency_ms=max_latency_ms,
+            max_concurrency=max_concurrency
+        )
+        self.scheduler.start()
+
+    async def aclose(self) -> None:
+        """Stop the scheduler and close the underlying OpenAI client and its connection pool"""
+        if self.scheduler is not None:
+            await self.scheduler.stop()
+        await self.client.close()
+
+    async def _create_completion(self, **request) -> Any:
+        """Create a chat completion, through the batching scheduler if enabled"""
+        if self.scheduler is not None:
+            return await self.scheduler.submit(**request)
+        return await self.client.chat.completions.create(**request)
+
+    async def generate_response(self, 
+                               prompt: str, 
+                               system_prompt: Optional[str] = None,
+                               temperature: float = 0.7) -> str:
+        """
+        Generate a complete response from the LLM.
         
         Args:
             prompt: The user's input prompt
@@ -29,6 +69,24 @@ class LLMService:
         Returns:
             str: The generated response
         """
+        chunks = [chunk async for chunk in self.stream_response(prompt, system_prompt, temperature)]
+        return "".join(chunks)
+
+    async def stream_response(self, 
+                             prompt: str, 
+                             system_prompt: Optional[str] = None,
+                             temperature: float = 0.7) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        
+        Args:
+            prompt: The user's input prompt
+            system_prompt: Optional system prompt to set context
+            temperature: Controls randomness in the response (0.0 to 1.0)
+            
+        Yields:
+            str: Successive chunks of the generated response
+        """
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
@@ -36,19 +94,35 @@ class LLMService:
         
         # For testing without an API key, return a mock response
         if not self.client.api_key or self.client.api_key.startswith("sk-your"):
-            return self._generate_mock_response(prompt, system_prompt)
+            yield self._generate_mock_response(prompt, system_prompt)
+            return
         
+        streamed = False
         try:
-            response = self.client.chat.completions.create(
+            stream = await self._create_completion(
                 model=self.model,
                 messages=messages,
-                temperature=temperature
+                temperature=temperature,
+                stream=True
             )
             
-            return response.choices[0].message.content
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        streamed = True
+                        yield delta
+            finally:
+                # Release the pooled connection even if the consumer stops early,
+                # e.g. when an SSE client disconnects
+                await stream.close()
         except Exception as e:
             print(f"Error calling OpenAI API: {e}")
-            return self._generate_mock_response(prompt, system_prompt)
+            # Only fall back if nothing has reached the caller yet
+            if not streamed:
+                yield self._generate_mock_response(prompt, system_prompt)
     
     def _generate_mock_response(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         """Generate a mock response for testing without an API key"""
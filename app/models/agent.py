@@ -3,13 +3,16 @@ Agent model for intelligent, memory-enabled LLM agents.
 """
 
 import uuid
-from typing import Dict, List, Optional, Any, Callable
-import json
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Any, Callable, Set
+import orjson
 import os
 from datetime import datetime
 
 from app.models.memory import AgentMemory
 from app.core.llm_service import LLMService
+from app.core.embedding_service import EmbeddingService
 
 class AgentTool:
     """Tool that an agent can use to interact with the external world"""
@@ -31,7 +34,8 @@ class Agent:
                 agent_id: Optional[str] = None, 
                 name: str = "Assistant",
                 persona: str = "I am a helpful AI assistant.",
-                llm_service: Optional[LLMService] = None):
+                llm_service: Optional[LLMService] = None,
+                embedding_service: Optional[EmbeddingService] = None):
         """
         Initialize a new agent or load an existing one.
         
@@ -40,21 +44,96 @@ class Agent:
             name: Human-readable name for the agent
             persona: Description of the agent's personality and behavior
             llm_service: LLM service to use for generating responses
+            embedding_service: Optional embedding service for semantic memory retrieval
         """
         self.agent_id = agent_id or str(uuid.uuid4())
         self.name = name
+        self.tools: Dict[str, AgentTool] = {}
+        self._refresh_tools_footer()
         self.persona = persona
-        self.memory = AgentMemory(agent_id=self.agent_id)
+        self.embedding_service = embedding_service
+        self.memory = AgentMemory(agent_id=self.agent_id, embedding_service=embedding_service)
         self.llm_service = llm_service or LLMService()
-        self.tools: Dict[str, AgentTool] = {}
         self.context_window_limit = 4000  # tokens, approximated
         self.conversation_history: List[Dict] = []
+        self._unsaved_history: List[Dict] = []  # messages added since the last save
+        self._pending_reflections: Set[asyncio.Task] = set()
+        # Held for the whole of a turn, so concurrent messages take turns instead of interleaving
+        self._turn_lock = asyncio.Lock()
+        
+        # Formatted recent-conversation lines for the context window, with a
+        # running character count so the window is never re-measured
+        self._recent_lines: Deque[str] = deque(maxlen=10)
+        self._recent_chars = 0
+        
+    @property
+    def persona(self) -> str:
+        """Description of the agent's personality and behavior"""
+        return self._persona
+    
+    @persona.setter
+    def persona(self, persona: str) -> None:
+        self._persona = persona
+        # The system prompt always starts with the persona, so build that prefix
+        # once; an identical prefix across turns also suits provider-side prompt caching
+        self._persona_header = f"""
+        {persona}
+        
+        You have access to your past memories and knowledge:
+        """
+    
+    def _refresh_tools_footer(self) -> None:
+        """Rebuild the part of the system prompt that follows the context"""
+        self._tools_footer = f"""
         
+        Available tools: {", ".join(self.tools.keys()) if self.tools else "None"}
+        
+        Base your response on your memories and persona. If you don't know something, 
+        say so rather than making up information.
+        """
+    
     def register_tool(self, name: str, description: str, function: Callable) -> None:
         """Register a tool that the agent can use"""
         self.tools[name] = AgentTool(name=name, description=description, function=function)
-        
-    def generate_response(self, user_input: str) -> str:
+        self._refresh_tools_footer()
+    
+    def _append_history(self, role: str, content: str, timestamp: str) -> None:
+        """Append a message to the conversation history and the recent context window"""
+        message = {
+            "role": role,
+            "content": content,
+            "timestamp": timestamp
+        }
+        self.conversation_history.append(message)
+        self._unsaved_history.append(message)
+        self._push_recent_line(message)
+    
+    def _push_recent_line(self, message: Dict) -> None:
+        """Add a message to the recent context window, keeping the character count current"""
+        if len(self._recent_lines) == self._recent_lines.maxlen:
+            self._recent_chars -= len(self._recent_lines[0])
+        line = f"- {message['role'].capitalize()}: {message['content']}"
+        self._recent_lines.append(line)
+        self._recent_chars += len(line)
+    
+    def take_unsaved_history(self) -> List[Dict]:
+        """Take the messages added since the last save, marking them saved"""
+        messages, self._unsaved_history = self._unsaved_history, []
+        return messages
+    
+    def restore_history(self, messages: List[Dict]) -> None:
+        """Append previously saved messages to the conversation history"""
+        self.conversation_history.extend(messages)
+        self._rebuild_recent_window()
+    
+    def _rebuild_recent_window(self) -> None:
+        """Rebuild the recent context window from the conversation history"""
+        self._recent_lines.clear()
+        self._recent_chars = 0
+        for message in self.conversation_history[-self._recent_lines.maxlen:]:
+            self._push_recent_line(message)
+        
+    async def generate_response(self, user_input: str) -> str:
         """
         Generate a response to user input, using memory and persona.
         
@@ -64,70 +143,76 @@ class Agent:
         Returns:
             str: The agent's response
         """
-        # Add user message to conversation history
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_input,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Record in memory
-        conv_id = f"conv_{len(self.conversation_history)}"
-        self.memory.add_conversation(
-            conv_id=conv_id,
-            content=user_input,
-            sender="user",
-            receiver=self.agent_id,
-            importance=0.8  # Default importance for user messages
-        )
-        
-        # Retrieve relevant memories based on the input
-        relevant_memories = self.memory.get_relevant_memories(user_input, limit=5)
-        
-        # Build context from memories and conversation history
-        context = self._build_context(user_input, relevant_memories)
-        
-        # Generate system prompt with agent persona and context
-        system_prompt = f"""
-        {self.persona}
-        
-        You have access to your past memories and knowledge:
-        {context}
-        
-        Available tools: {", ".join(self.tools.keys()) if self.tools else "None"}
-        
-        Base your response on your memories and persona. If you don't know something, 
-        say so rather than making up information.
+        chunks = [chunk async for chunk in self.stream_response(user_input)]
+        return "".join(chunks)
+    
+    async def stream_response(self, user_input: str) -> AsyncIterator[str]:
         """
+        Stream a response to user input, using memory and persona.
+        Memory and conversation history are updated once the stream completes;
+        messages sent to the agent meanwhile wait for the turn to finish.
         
-        # Get response from LLM
-        response = self.llm_service.generate_response(
-            prompt=user_input,
-            system_prompt=system_prompt,
-            temperature=0.7
-        )
-        
-        # Add response to conversation history
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # Record in memory
-        response_id = f"resp_{len(self.conversation_history)}"
-        self.memory.add_conversation(
-            conv_id=response_id,
-            content=response,
-            sender=self.agent_id,
-            receiver="user",
-            importance=0.7  # Default importance for agent responses
-        )
-        
-        # Add a reflection about this exchange (simulate "thinking")
-        self._add_reflection(user_input, response)
-        
-        return response
+        Args:
+            user_input: The user's message
+            
+        Yields:
+            str: Successive chunks of the agent's response
+        """
+        async with self._turn_lock:
+            # Timestamp the turn once; both of its messages and memories share it
+            now = datetime.now()
+            timestamp = now.isoformat()
+            
+            # Add user message to conversation history
+            self._append_history("user", user_input, timestamp)
+            
+            # Retrieve relevant memories based on the input, embedding it off the event loop
+            relevant_memories = await self.memory.get_relevant_memories_async(user_input, limit=5)
+            
+            # Build context from memories and conversation history
+            context = self._build_context(user_input, relevant_memories)
+            
+            # Generate system prompt with agent persona and context
+            system_prompt = self._persona_header + context + self._tools_footer
+            
+            # Stream response from LLM, accumulating the full text for memory
+            response_parts = []
+            async for chunk in self.llm_service.stream_response(
+                prompt=user_input,
+                system_prompt=system_prompt,
+                temperature=0.7
+            ):
+                response_parts.append(chunk)
+                yield chunk
+            response = "".join(response_parts)
+            
+            # Add response to conversation history
+            self._append_history("assistant", response, timestamp)
+            
+            # Record the whole turn in memory at once
+            conv_id = f"conv_{len(self.conversation_history) - 1}"
+            response_id = f"resp_{len(self.conversation_history)}"
+            await self.memory.add_turn_async(self.agent_id, conv_id, user_input, response_id, response, created_at=now)
+            
+            # Add a reflection about this exchange (simulate "thinking") in the
+            # background, so the caller isn't kept waiting on a second LLM call
+            reflection_id = f"refl_{len(self.conversation_history)}"
+            related_memories = [conv_id, response_id]
+            task = asyncio.create_task(
+                self._add_reflection(user_input, response, reflection_id, related_memories)
+            )
+            self._pending_reflections.add(task)
+            task.add_done_callback(self._pending_reflections.discard)
+    
+    async def wait_for_reflections(self) -> None:
+        """Wait for any reflections still being generated in the background"""
+        if self._pending_reflections:
+            await asyncio.gather(*self._pending_reflections, return_exceptions=True)
+    
+    def cancel_reflections(self) -> None:
+        """Cancel any reflections still being generated in the background"""
+        for task in self._pending_reflections:
+            task.cancel()
     
     def _build_context(self, query: str, memories: List) -> str:
         """
@@ -141,6 +226,8 @@ class Agent:
             str: Formatted context string
         """
         context_parts = []
+        # Running character count of the parts, so the joined string needn't be measured
+        context_chars = 0
         
         # Add memories with their categories
         if memories:
@@ -155,29 +242,30 @@ class Agent:
                 else:
                     memory_type = "Fact"
                     context_parts.append(f"- {memory_type}: {memory.content}")
+            context_chars = sum(len(part) for part in context_parts)
         
-        # Add recent conversation context (last 5 messages)
-        if self.conversation_history:
+        # Add recent conversation context (last 10 messages)
+        if self._recent_lines:
             context_parts.append("\nRecent conversation:")
-            recent_history = self.conversation_history[-10:] if len(self.conversation_history) > 10 else self.conversation_history
-            for msg in recent_history:
-                context_parts.append(f"- {msg['role'].capitalize()}: {msg['content']}")
+            context_parts.extend(self._recent_lines)
+            context_chars += len("\nRecent conversation:") + self._recent_chars
         
-        # Combine all parts, being mindful of approximate token count
-        # This is a simple approximation - production systems would use a proper tokenizer
-        context = "\n".join(context_parts)
-        
-        # Very simple token count approximation (4 chars ≈ 1 token)
+        # Very simple token count approximation (4 chars ≈ 1 token), counting
+        # the newline separators the parts will be joined with.
         # In a real system, you'd use a proper tokenizer
-        approx_token_count = len(context) // 4
+        approx_token_count = (context_chars + max(len(context_parts) - 1, 0)) // 4
         if approx_token_count > self.context_window_limit:
             # If over limit, truncate memories
             return "Context is too large to include all memories. Only the most relevant are included: \n" + \
                    "\n".join(context_parts[:5]) + "\n(additional context omitted due to token limits)"
         
+        # Combine all parts
+        context = "\n".join(context_parts)
+        
         return context
     
-    def _add_reflection(self, user_input: str, response: str) -> None:
+    async def _add_reflection(self, user_input: str, response: str, 
+                              reflection_id: str, related_memories: List[str]) -> None:
         """
         Add a reflection based on the current exchange.
         This simulates the agent "thinking" about what happened.
@@ -185,6 +273,8 @@ class Agent:
         Args:
             user_input: User's message
             response: Agent's response
+            reflection_id: ID to store the reflection under
+            related_memories: IDs of the conversation memories for this exchange
         """
         # In a full implementation, we'd use the LLM to generate a reflection
         # For this simplified version, we'll create a basic reflection
@@ -197,37 +287,44 @@ class Agent:
         what they might ask next, and what information would be helpful to remember for future interactions.
         """
         
-        reflection_content = self.llm_service.generate_response(
+        reflection_content = await self.llm_service.generate_response(
             prompt=reflection_prompt,
             system_prompt="You are creating internal reflections for an AI assistant to help its memory. Be concise but insightful."
         )
         
         # Add to memory
-        reflection_id = f"refl_{len(self.conversation_history)}"
-        self.memory.add_reflection(
+        await self.memory.add_reflection_async(
             refl_id=reflection_id,
             content=reflection_content,
-            related_memories=[f"conv_{len(self.conversation_history)-1}", f"resp_{len(self.conversation_history)}"],
+            related_memories=related_memories,
             importance=0.9  # Reflections have high importance
         )
     
-    def save(self, directory: str = "./data/agents") -> str:
+    def snapshot(self, directory: str = "./data/agents") -> Dict:
         """
-        Save the agent state to disk.
+        Serialize a full snapshot of the agent state, taking ownership of pending changes.
+        Call this on the event loop, where turns mutate the agent, then write it with
+        write_snapshot from any thread.
         
         Args:
-            directory: Directory to save agent data in
+            directory: Directory the agent data is saved in
             
         Returns:
-            str: Path to saved agent file
+            Dict: The serialized metadata and memory, and how many bytes of each
+            append-only log they cover
         """
-        # Create directory if it doesn't exist
-        os.makedirs(directory, exist_ok=True)
-        
-        # Save agent metadata
         agent_path = os.path.join(directory, f"{self.agent_id}")
-        os.makedirs(agent_path, exist_ok=True)
         
+        # Everything logged so far is part of the agent state being serialized
+        logged = {}
+        for log_name in ("history.jsonl", "memory.jsonl"):
+            try:
+                logged[log_name] = os.path.getsize(os.path.join(agent_path, log_name))
+            except FileNotFoundError:
+                logged[log_name] = 0
+        
+        # Take ownership of pending messages first; the snapshot covers them
+        self._unsaved_history = []
         metadata = {
             "agent_id": self.agent_id,
             "name": self.name,
@@ -236,23 +333,107 @@ class Agent:
             "conversation_history": self.conversation_history
         }
         
-        with open(os.path.join(agent_path, "metadata.json"), 'w') as f:
-            json.dump(metadata, f, indent=2)
+        return {
+            "metadata": orjson.dumps(metadata, option=orjson.OPT_INDENT_2),
+            "memory": self.memory.dump_snapshot(),
+            "logged": logged
+        }
+    
+    def write_snapshot(self, directory: str, snapshot: Dict) -> str:
+        """
+        Write a snapshot taken by snapshot() to disk, then drop the log entries it covers.
         
-        # Save memory
-        memory_path = os.path.join(agent_path, "memory.json")
-        self.memory.save_to_file(memory_path)
+        Args:
+            directory: Directory to save agent data in
+            snapshot: The serialized agent state
+            
+        Returns:
+            str: Path to saved agent file
+        """
+        agent_path = os.path.join(directory, f"{self.agent_id}")
+        os.makedirs(agent_path, exist_ok=True)
+        
+        # Write to temporary files and swap them in, so a crash never leaves a partial snapshot
+        for file_name, key in (("metadata.json", "metadata"), ("memory.json", "memory")):
+            file_path = os.path.join(agent_path, file_name)
+            with open(f"{file_path}.tmp", 'wb') as f:
+                f.write(snapshot[key])
+            os.replace(f"{file_path}.tmp", file_path)
+        
+        # Keep only what was logged after the snapshot was taken
+        for log_name, covered in snapshot["logged"].items():
+            log_path = os.path.join(agent_path, log_name)
+            if not os.path.exists(log_path):
+                continue
+            if os.path.getsize(log_path) <= covered:
+                os.remove(log_path)
+                continue
+            with open(log_path, 'rb') as f:
+                f.seek(covered)
+                tail = f.read()
+            with open(f"{log_path}.tmp", 'wb') as f:
+                f.write(tail)
+            os.replace(f"{log_path}.tmp", log_path)
+        
+        return agent_path
+    
+    def save(self, directory: str = "./data/agents") -> str:
+        """
+        Save a full snapshot of the agent state to disk.
+        This also compacts the append-only logs written by write_changes.
+        
+        Args:
+            directory: Directory to save agent data in
+            
+        Returns:
+            str: Path to saved agent file
+        """
+        return self.write_snapshot(directory, self.snapshot(directory))
+    
+    def take_changes(self) -> Dict[str, bytes]:
+        """
+        Serialize what changed since the last save as JSONL log lines, marking it saved.
+        Call this on the event loop, then append the lines with write_changes from any thread.
+        
+        Returns:
+            Dict[str, bytes]: Log lines to append, keyed by log file name
+        """
+        return {
+            "history.jsonl": b"".join(orjson.dumps(m) + b"\n" for m in self.take_unsaved_history()),
+            "memory.jsonl": self.memory.dump_unsaved()
+        }
+    
+    def write_changes(self, directory: str, changes: Dict[str, bytes]) -> str:
+        """
+        Append changes taken by take_changes() to the agent's JSONL logs.
+        
+        Args:
+            directory: Directory the agent data is saved in
+            changes: Log lines to append, keyed by log file name
+            
+        Returns:
+            str: Path to saved agent file
+        """
+        agent_path = os.path.join(directory, f"{self.agent_id}")
+        for log_name, lines in changes.items():
+            if lines:
+                with open(os.path.join(agent_path, log_name), 'ab') as f:
+                    f.write(lines)
         
         return agent_path
     
     @classmethod
-    def load(cls, agent_id: str, directory: str = "./data/agents") -> 'Agent':
+    def load(cls, agent_id: str, directory: str = "./data/agents", 
+             llm_service: Optional[LLMService] = None,
+             embedding_service: Optional[EmbeddingService] = None) -> 'Agent':
         """
-        Load an agent from disk.
+        Load an agent from disk, replaying any changes logged since its last full save.
         
         Args:
             agent_id: ID of the agent to load
             directory: Directory containing agent data
+            llm_service: LLM service to use for generating responses
+            embedding_service: Optional embedding service for semantic memory retrieval
             
         Returns:
             Agent: The loaded agent
@@ -260,21 +441,38 @@ class Agent:
         agent_path = os.path.join(directory, agent_id)
         
         # Load metadata
-        with open(os.path.join(agent_path, "metadata.json"), 'r') as f:
-            metadata = json.load(f)
+        with open(os.path.join(agent_path, "metadata.json"), 'rb') as f:
+            metadata = orjson.loads(f.read())
         
         # Create agent
         agent = cls(
             agent_id=metadata["agent_id"],
             name=metadata["name"],
-            persona=metadata["persona"]
+            persona=metadata["persona"],
+            llm_service=llm_service,
+            embedding_service=embedding_service
         )
         
         # Load conversation history
+        logged_messages = []
+        history_log_path = os.path.join(agent_path, "history.jsonl")
+        if os.path.exists(history_log_path):
+            with open(history_log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        logged_messages.append(orjson.loads(line))
+                    except orjson.JSONDecodeError:
+                        # A torn final line from an interrupted write
+                        print(f"Warning: Skipping unreadable line in {history_log_path}")
         agent.conversation_history = metadata["conversation_history"]
+        agent.restore_history(logged_messages)
         
         # Load memory
         memory_path = os.path.join(agent_path, "memory.json")
-        agent.memory = AgentMemory.load_from_file(memory_path)
+        agent.memory = AgentMemory.load_from_file(
+            memory_path,
+            embedding_service=embedding_service,
+            log_path=os.path.join(agent_path, "memory.jsonl")
+        )
         
-        return agent 
\ No newline at end of file
+        return agent
\ No newline at end of file
@@ -3,166 +3,551 @@ Memory models for agent system.
 Provides structured memory management for agents with different types of memory.
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
-import json
-from pydantic import BaseModel, Field
+from array import array
+from collections import defaultdict
+import asyncio
+from operator import attrgetter
+import heapq
+import orjson
+import os
+import re
+import numpy as np
 
-class MemoryItem(BaseModel):
+from app.core.embedding_service import EmbeddingService
+
+# Word tokens used for keyword retrieval
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def _parse_timestamps(item_data: Dict) -> Dict:
+    """Parse a serialized ISO created_at back into a datetime, in place"""
+    created_at = item_data.get("created_at")
+    if isinstance(created_at, str):
+        item_data["created_at"] = datetime.fromisoformat(created_at)
+    return item_data
+
+# Memory items are plain slotted dataclasses: they are created on every turn and
+# serialized on every save, and are only ever built from trusted data. created_at
+# is always a datetime; to_dict leaves it as one for orjson to write as ISO 8601
+@dataclass(slots=True, kw_only=True)
+class MemoryItem:
     """Base class for a memory item"""
     id: str
     content: str
-    created_at: datetime = Field(default_factory=datetime.now)
+    created_at: datetime = field(default_factory=datetime.now)
     importance: float = 1.0  # 0.0 to 1.0, with 1.0 being most important
-    metadata: Dict[str, Any] = Field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MemoryItem':
+        """Rebuild a memory item from the output of to_dict"""
+        return cls(**_parse_timestamps(data))
     
     def to_dict(self) -> Dict:
         return {
             "id": self.id,
             "content": self.content,
-            "created_at": self.created_at.isoformat(),
+            "created_at": self.created_at,
             "importance": self.importance,
             "metadata": self.metadata
         }
 
+@dataclass(slots=True, kw_only=True)
 class FactMemory(MemoryItem):
     """Factual information to be remembered"""
     pass
 
+@dataclass(slots=True, kw_only=True)
 class ConversationMemory(MemoryItem):
     """Memory of conversation exchanges"""
     sender: str
     receiver: str
     
     def to_dict(self) -> Dict:
-        base_dict = super().to_dict()
-        base_dict.update({
+        return {
+            "id": self.id,
+            "content": self.content,
+            "created_at": self.created_at,
+            "importance": self.importance,
+            "metadata": self.metadata,
             "sender": self.sender,
             "receiver": self.receiver
-        })
-        return base_dict
+        }
 
+@dataclass(slots=True, kw_only=True)
 class ReflectionMemory(MemoryItem):
     """Agent's reflections and insights based on past information"""
-    related_memories: List[str] = Field(default_factory=list)
+    related_memories: List[str] = field(default_factory=list)
     
     def to_dict(self) -> Dict:
-        base_dict = super().to_dict()
-        base_dict.update({
+        return {
+            "id": self.id,
+            "content": self.content,
+            "created_at": self.created_at,
+            "importance": self.importance,
+            "metadata": self.metadata,
             "related_memories": self.related_memories
-        })
-        return base_dict
+        }
 
 class AgentMemory:
     """Main memory manager for an agent"""
-    def __init__(self, agent_id: str):
+    def __init__(self, agent_id: str, embedding_service: Optional[EmbeddingService] = None):
         self.agent_id = agent_id
         self.facts: Dict[str, FactMemory] = {}
         self.conversations: Dict[str, ConversationMemory] = {}
         self.reflections: Dict[str, ReflectionMemory] = {}
         
-    def add_fact(self, fact_id: str, content: str, importance: float = 1.0, metadata: Dict = None) -> FactMemory:
+        # Every memory gets a stable integer row, shared by the indexes below
+        self._by_id: Dict[str, MemoryItem] = {}
+        self._rows: Dict[str, int] = {}
+        self._row_ids: List[str] = []
+        self._row_importance = array("d")  # per row; viewed as a NumPy array when ranking
+        
+        # Inverted keyword index: token -> rows of memories containing it
+        self._index: Dict[str, Set[int]] = defaultdict(set)
+        
+        # Memories added since the last save, as (memory type, item) pairs
+        self._unsaved: List[Tuple[str, MemoryItem]] = []
+        
+        # When importance was last decayed by compact()
+        self.last_compacted_at: Optional[datetime] = None
+        
+        # Semantic index: one normalized embedding row per memory, used instead
+        # of keyword matching when an embedding service is configured. The matrix
+        # is preallocated and doubled when full; rows past _emb_size are unused.
+        self.embedding_service: Optional[EmbeddingService] = None
+        self._emb = np.empty((0, 0), dtype=np.float32)
+        self._emb_size = 0
+        if embedding_service is not None:
+            self.enable_embeddings(embedding_service)
+    
+    def enable_embeddings(self, embedding_service: EmbeddingService) -> None:
+        """
+        Switch retrieval to embeddings, embedding all existing memories in one batch.
+        
+        Args:
+            embedding_service: Service used to embed memory contents and queries
+        """
+        self.embedding_service = embedding_service
+        self._emb_size = len(self._row_ids)
+        self._emb = np.empty((max(16, 2 * self._emb_size), embedding_service.dimension), dtype=np.float32)
+        if self._row_ids:
+            self._emb[:self._emb_size] = embedding_service.embed(
+                [self._by_id[mid].content for mid in self._row_ids]
+            )
+    
+    def _store_embeddings(self, rows: List[int], items: Tuple[MemoryItem, ...],
+                          embeddings: Optional[np.ndarray] = None) -> None:
+        """Embed memories' contents into their rows of the embedding matrix in one batch"""
+        size = max(self._emb_size, max(rows) + 1)
+        if size > len(self._emb):
+            # Double the capacity, so appends are amortized O(1)
+            capacity = len(self._emb)
+            while capacity < size:
+                capacity *= 2
+            grown = np.empty((capacity, self._emb.shape[1]), dtype=np.float32)
+            grown[:self._emb_size] = self._emb[:self._emb_size]
+            self._emb = grown
+        self._emb_size = size
+        if embeddings is None:
+            embeddings = self.embedding_service.embed([item.content for item in items])
+        self._emb[rows] = embeddings
+    
+    async def _embed_async(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embed texts in a worker thread, keeping the model off the event loop"""
+        if self.embedding_service is None:
+            return None
+        return await asyncio.to_thread(self.embedding_service.embed, texts)
+    
+    def _store(self, store: Dict[str, MemoryItem], *items: MemoryItem,
+               embeddings: Optional[np.ndarray] = None) -> None:
+        """Put memories into their store and the retrieval indexes, embedding them unless given their embeddings"""
+        rows = []
+        for item in items:
+            row = self._rows.get(item.id)
+            if row is None:
+                row = len(self._row_ids)
+                self._rows[item.id] = row
+                self._row_ids.append(item.id)
+                self._row_importance.append(item.importance)
+            else:
+                # Replacing a memory: drop the old content from the keyword index
+                for token in set(_tokenize(self._by_id[item.id].content)):
+                    self._index[token].discard(row)
+                self._row_importance[row] = item.importance
+            
+            store[item.id] = item
+            self._by_id[item.id] = item
+            for token in set(_tokenize(item.content)):
+                self._index[token].add(row)
+            rows.append(row)
+        
+        if self.embedding_service is not None and rows:
+            self._store_embeddings(rows, items, embeddings)
+        
+    def add_fact(self, fact_id: str, content: str, importance: float = 1.0, metadata: Dict = None,
+                 created_at: Optional[datetime] = None) -> FactMemory:
         """Add a fact to memory"""
         fact = FactMemory(
             id=fact_id,
             content=content,
+            created_at=created_at or datetime.now(),
             importance=importance,
             metadata=metadata or {}
         )
-        self.facts[fact_id] = fact
+        self._store(self.facts, fact)
+        self._unsaved.append(("fact", fact))
         return fact
         
     def add_conversation(self, conv_id: str, content: str, sender: str, 
-                         receiver: str, importance: float = 1.0, metadata: Dict = None) -> ConversationMemory:
+                         receiver: str, importance: float = 1.0, metadata: Dict = None,
+                         created_at: Optional[datetime] = None) -> ConversationMemory:
         """Add a conversation exchange to memory"""
         conversation = ConversationMemory(
             id=conv_id,
             content=content,
+            created_at=created_at or datetime.now(),
             sender=sender,
             receiver=receiver,
             importance=importance,
             metadata=metadata or {}
         )
-        self.conversations[conv_id] = conversation
+        self._store(self.conversations, conversation)
+        self._unsaved.append(("conversation", conversation))
         return conversation
         
+    def add_turn(self, agent_id: str, conv_id: str, user_input: str,
+                 response_id: str, response: str,
+                 created_at: Optional[datetime] = None,
+                 embeddings: Optional[np.ndarray] = None) -> Tuple[ConversationMemory, ConversationMemory]:
+        """
+        Add both messages of a conversation turn to memory in one batch,
+        indexing and embedding them together.
+        
+        Args:
+            agent_id: ID of the agent that responded
+            conv_id: ID for the user's message
+            user_input: The user's message
+            response_id: ID for the agent's response
+            response: The agent's response
+            created_at: Time of the turn, defaulting to now
+            embeddings: Precomputed embeddings of the two messages, if any
+            
+        Returns:
+            Tuple[ConversationMemory, ConversationMemory]: The user and agent messages
+        """
+        created_at = created_at or datetime.now()
+        message = ConversationMemory(
+            id=conv_id,
+            content=user_input,
+            created_at=created_at,
+            sender="user",
+            receiver=agent_id,
+            importance=0.8  # Default importance for user messages
+        )
+        reply = ConversationMemory(
+            id=response_id,
+            content=response,
+            created_at=created_at,
+            sender=agent_id,
+            receiver="user",
+            importance=0.7  # Default importance for agent responses
+        )
+        self._store(self.conversations, message, reply, embeddings=embeddings)
+        self._unsaved.extend((("conversation", message), ("conversation", reply)))
+        return message, reply
+    
+    async def add_turn_async(self, agent_id: str, conv_id: str, user_input: str,
+                             response_id: str, response: str,
+                             created_at: Optional[datetime] = None) -> Tuple[ConversationMemory, ConversationMemory]:
+        """Like add_turn, but embeds the messages in a worker thread before storing them"""
+        embeddings = await self._embed_async([user_input, response])
+        return self.add_turn(agent_id, conv_id, user_input, response_id, response,
+                             created_at=created_at, embeddings=embeddings)
+        
     def add_reflection(self, refl_id: str, content: str, 
                        related_memories: List[str] = None, 
-                       importance: float = 1.0, metadata: Dict = None) -> ReflectionMemory:
+                       importance: float = 1.0, metadata: Dict = None,
+                       created_at: Optional[datetime] = None,
+                       embeddings: Optional[np.ndarray] = None) -> ReflectionMemory:
         """Add a reflection to memory"""
         reflection = ReflectionMemory(
             id=refl_id,
             content=content,
+            created_at=created_at or datetime.now(),
             related_memories=related_memories or [],
             importance=importance,
             metadata=metadata or {}
         )
-        self.reflections[refl_id] = reflection
+        self._store(self.reflections, reflection, embeddings=embeddings)
+        self._unsaved.append(("reflection", reflection))
         return reflection
+    
+    async def add_reflection_async(self, refl_id: str, content: str,
+                                   related_memories: List[str] = None,
+                                   importance: float = 1.0, metadata: Dict = None,
+                                   created_at: Optional[datetime] = None) -> ReflectionMemory:
+        """Like add_reflection, but embeds the reflection in a worker thread before storing it"""
+        embeddings = await self._embed_async([content])
+        return self.add_reflection(refl_id, content, related_memories, importance, metadata,
+                                   created_at=created_at, embeddings=embeddings)
         
     def get_relevant_memories(self, query: str, limit: int = 5) -> List[MemoryItem]:
         """
         Get memories relevant to the given query.
-        This is a simple implementation - a production system would use 
-        embeddings and semantic search.
+        Uses embedding similarity when an embedding service is configured,
+        and falls back to keyword matching otherwise.
         """
-        # Combine all memories and sort by importance
-        all_memories = list(self.facts.values()) + list(self.conversations.values()) + list(self.reflections.values())
-        all_memories.sort(key=lambda x: x.importance, reverse=True)
+        if self.embedding_service is not None:
+            return self._get_similar_memories(query, limit)
         
-        # Simple keyword matching (would be replaced with embeddings in production)
-        query_terms = query.lower().split()
-        scored_memories = []
+        postings = [self._index[term] for term in _tokenize(query) if term in self._index]
+        if not postings or limit <= 0:
+            return []
         
-        for memory in all_memories:
-            score = 0
-            for term in query_terms:
-                if term in memory.content.lower():
-                    score += 1
-            if score > 0:
-                scored_memories.append((memory, score))
+        # Score each memory by how many query terms it contains: count its row
+        # across the matching postings in one vectorized pass
+        rows = np.concatenate([np.fromiter(p, dtype=np.intp, count=len(p)) for p in postings])
+        scores = np.bincount(rows, minlength=len(self._row_ids))
+        candidates = np.flatnonzero(scores)
+        importance = np.frombuffer(self._row_importance, dtype=np.float64)[candidates]
         
-        # Sort by relevance score then importance
-        scored_memories.sort(key=lambda x: (x[1], x[0].importance), reverse=True)
-        return [memory for memory, _ in scored_memories[:limit]]
+        # Rank by relevance score then importance, earlier memories first on ties
+        order = np.lexsort((candidates, -importance, -scores[candidates]))[:limit]
+        return [self._by_id[self._row_ids[row]] for row in candidates[order]]
     
-    def save_to_file(self, file_path: str) -> None:
-        """Save memory to a file"""
+    async def get_relevant_memories_async(self, query: str, limit: int = 5) -> List[MemoryItem]:
+        """Like get_relevant_memories, but embeds the query in a worker thread"""
+        if self.embedding_service is None:
+            return self.get_relevant_memories(query, limit)
+        if self._emb_size == 0 or limit <= 0:
+            return []
+        
+        query_vector = (await self._embed_async([query]))[0]
+        return self._get_similar_memories(query, limit, query_vector)
+    
+    def _get_similar_memories(self, query: str, limit: int,
+                              query_vector: Optional[np.ndarray] = None) -> List[MemoryItem]:
+        """Get the memories whose embeddings have the highest cosine similarity to the query"""
+        count = self._emb_size
+        if count == 0 or limit <= 0:
+            return []
+        
+        # Rows are normalized, so one matrix-vector product gives all cosine similarities
+        if query_vector is None:
+            query_vector = self.embedding_service.embed([query])[0]
+        scores = self._emb[:count] @ query_vector
+        
+        # Select the top rows without fully sorting, then order just those
+        if limit < count:
+            top_rows = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top_rows = np.arange(count)
+        top_rows = top_rows[np.argsort(-scores[top_rows])]
+        return [self._by_id[self._row_ids[row]] for row in top_rows]
+    
+    def compact(self, max_items: int = 10_000, half_life_days: float = 30.0,
+                min_importance: float = 0.01, now: Optional[datetime] = None) -> int:
+        """
+        Decay the importance of memories with age and evict the least important,
+        so the store, and with it the cost of retrieval, stays bounded.
+        Importance halves every half_life_days; each call decays a memory only for
+        the time since the last compaction (or its creation, if later), so repeated
+        compactions compound to the same decay. Save a full snapshot afterwards.
+        
+        Args:
+            max_items: Maximum number of memories to keep
+            half_life_days: Days for a memory's importance to halve
+            min_importance: Memories whose decayed importance falls below this are evicted
+            now: Time to decay up to, defaulting to now
+            
+        Returns:
+            int: Number of memories evicted
+        """
+        now = now or datetime.now()
+        for item in self._by_id.values():
+            since = item.created_at
+            if self.last_compacted_at is not None and self.last_compacted_at > since:
+                since = self.last_compacted_at
+            age_days = max((now - since).total_seconds(), 0.0) / 86400
+            item.importance *= 0.5 ** (age_days / half_life_days)
+        self.last_compacted_at = now
+        
+        survivors = [item for item in self._by_id.values() if item.importance >= min_importance]
+        if len(survivors) > max_items:
+            survivors = heapq.nlargest(max_items, survivors, key=attrgetter("importance"))
+        evicted = len(self._by_id) - len(survivors)
+        self._rebuild(survivors)
+        return evicted
+    
+    def _rebuild(self, items: List[MemoryItem]) -> None:
+        """Reset the stores and retrieval indexes to hold only the given memories, keeping their embeddings"""
+        # Keep the surviving memories in their original order
+        items.sort(key=lambda item: self._rows[item.id])
+        if self.embedding_service is not None:
+            embeddings = self._emb[[self._rows[item.id] for item in items]]
+        
+        stores = {FactMemory: self.facts, ConversationMemory: self.conversations, ReflectionMemory: self.reflections}
+        for store in stores.values():
+            store.clear()
+        self._by_id = {}
+        self._rows = {}
+        self._row_ids = []
+        self._row_importance = array("d")
+        self._index = defaultdict(set)
+        
+        for row, item in enumerate(items):
+            stores[type(item)][item.id] = item
+            self._by_id[item.id] = item
+            self._rows[item.id] = row
+            self._row_ids.append(item.id)
+            self._row_importance.append(item.importance)
+            for token in set(_tokenize(item.content)):
+                self._index[token].add(row)
+        
+        if self.embedding_service is not None:
+            self._emb[:len(items)] = embeddings
+            self._emb_size = len(items)
+        self._unsaved = [(memory_type, item) for memory_type, item in self._unsaved if item.id in self._by_id]
+    
+    def dump_snapshot(self) -> bytes:
+        """
+        Serialize a full snapshot of memory, taking ownership of pending items.
+        Call this on the thread that mutates the memory (the event loop), so the
+        stores are never iterated while a turn changes them; write the bytes anywhere.
+        
+        Returns:
+            bytes: The snapshot, as written by save_to_file
+        """
+        # Take ownership of pending items first; the snapshot covers them
+        self._unsaved = []
         memory_data = {
             "agent_id": self.agent_id,
             "facts": {k: v.to_dict() for k, v in self.facts.items()},
             "conversations": {k: v.to_dict() for k, v in self.conversations.items()},
-            "reflections": {k: v.to_dict() for k, v in self.reflections.items()}
+            "reflections": {k: v.to_dict() for k, v in self.reflections.items()},
+            "order": self._row_ids,
+            "last_compacted_at": self.last_compacted_at.isoformat() if self.last_compacted_at else None
         }
+        return orjson.dumps(memory_data, option=orjson.OPT_INDENT_2)
+    
+    def save_to_file(self, file_path: str) -> None:
+        """Save a full snapshot of memory to a file"""
+        # Write to a temporary file and swap it in, so a crash never leaves a partial snapshot
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.dump_snapshot())
+        os.replace(tmp_path, file_path)
+    
+    def take_unsaved(self) -> List[Tuple[str, MemoryItem]]:
+        """Take the (memory type, item) pairs added since the last save, marking them saved"""
+        items, self._unsaved = self._unsaved, []
+        return items
+    
+    def dump_unsaved(self) -> bytes:
+        """
+        Serialize the memories added since the last save as JSONL log lines,
+        marking them saved. Each turn appends only these, instead of rewriting the full snapshot.
+        
+        Returns:
+            bytes: The log lines, empty if nothing changed
+        """
+        return b"".join(
+            orjson.dumps({"memory_type": memory_type, **item.to_dict()}) + b"\n"
+            for memory_type, item in self.take_unsaved()
+        )
+    
+    def restore_item(self, memory_type: str, item_data: Dict) -> None:
+        """Rebuild a saved memory item (as written by to_dict) and store it"""
+        if memory_type == "fact":
+            self._store(self.facts, FactMemory.from_dict(item_data))
+        elif memory_type == "conversation":
+            # Make sure the conversation data has sender and receiver fields
+            if "sender" not in item_data or "receiver" not in item_data:
+                print(f"Warning: Conversation {item_data.get('id')} missing sender or receiver fields. Skipping.")
+                return
+            self._store(self.conversations, ConversationMemory.from_dict(item_data))
+        elif memory_type == "reflection":
+            # Make sure reflection data has related_memories
+            if "related_memories" not in item_data:
+                item_data["related_memories"] = []
+            self._store(self.reflections, ReflectionMemory.from_dict(item_data))
+        else:
+            print(f"Warning: Unknown memory type {memory_type} for {item_data.get('id')}. Skipping.")
+    
+    async def restore_items_async(self, items: List[Tuple[str, Dict]]) -> None:
+        """
+        Restore saved memory items, embedding them in one batch in a worker thread
+        rather than one at a time on the event loop.
         
-        with open(file_path, 'w') as f:
-            json.dump(memory_data, f, indent=2)
+        Args:
+            items: (memory type, item data) pairs, in the order they were added
+        """
+        embedding_service, self.embedding_service = self.embedding_service, None
+        try:
+            for memory_type, item_data in items:
+                self.restore_item(memory_type, item_data)
+        finally:
+            self.embedding_service = embedding_service
+        
+        if embedding_service is None:
+            return
+        rows = sorted({self._rows[item_data["id"]] for _, item_data in items if item_data["id"] in self._rows})
+        if not rows:
+            return
+        restored = [self._by_id[self._row_ids[row]] for row in rows]
+        embeddings = await self._embed_async([item.content for item in restored])
+        self._store_embeddings(rows, tuple(restored), embeddings)
     
     @classmethod
-    def load_from_file(cls, file_path: str) -> 'AgentMemory':
-        """Load memory from a file"""
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+    def load_from_file(cls, file_path: str, 
+                       embedding_service: Optional[EmbeddingService] = None,
+                       log_path: Optional[str] = None) -> 'AgentMemory':
+        """
+        Load memory from a snapshot file, replaying the append-only log if given.
+        The files are ones written by save_to_file/dump_unsaved, so items are
+        rebuilt directly from their fields without validation.
+        """
+        with open(file_path, 'rb') as f:
+            data = orjson.loads(f.read())
         
         memory = cls(agent_id=data["agent_id"])
+        if data.get("last_compacted_at"):
+            memory.last_compacted_at = datetime.fromisoformat(data["last_compacted_at"])
         
-        # Load facts
-        for fact_id, fact_data in data["facts"].items():
-            memory.facts[fact_id] = FactMemory(**fact_data)
-            
-        # Load conversations
-        for conv_id, conv_data in data["conversations"].items():
-            # Make sure the conversation data has sender and receiver fields
-            if "sender" not in conv_data or "receiver" not in conv_data:
-                print(f"Warning: Conversation {conv_id} missing sender or receiver fields. Skipping.")
-                continue
-            memory.conversations[conv_id] = ConversationMemory(**conv_data)
-            
-        # Load reflections
-        for refl_id, refl_data in data["reflections"].items():
-            # Make sure reflection data has related_memories
-            if "related_memories" not in refl_data:
-                refl_data["related_memories"] = []
-            memory.reflections[refl_id] = ReflectionMemory(**refl_data)
+        # Load the snapshot, keeping the memories' rows in their saved order
+        # (older snapshots without one load facts, conversations, then reflections)
+        snapshot = {}
+        for memory_type, store in (("fact", "facts"), ("conversation", "conversations"),
+                                   ("reflection", "reflections")):
+            for item_id, item_data in data[store].items():
+                snapshot[item_id] = (memory_type, item_data)
+        for item_id in data.get("order", []):
+            if item_id in snapshot:
+                memory.restore_item(*snapshot.pop(item_id))
+        for memory_type, item_data in snapshot.values():
+            memory.restore_item(memory_type, item_data)
+        
+        # Replay memories appended since the snapshot
+        if log_path and os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        item_data = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A torn final line from an interrupted write
+                        print(f"Warning: Skipping unreadable line in {log_path}")
+                        continue
+                    memory.restore_item(item_data.pop("memory_type"), item_data)
+        
+        # Embed everything loaded in a single batch
+        if embedding_service is not None:
+            memory.enable_embeddings(embedding_service)
             
-        return memory 
\ No newline at end of file
+        return memory
\ No newline at end of file
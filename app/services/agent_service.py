@@ -3,25 +3,192 @@ Agent service for managing agent instances.
 """
 
 import os
-import json
-from typing import Dict, List, Optional
+import ast
+import math
+import operator
+import shutil
+import orjson
+import asyncio
+import functools
+from typing import AsyncIterator, Dict, List, Optional, Set
 import uuid
+from datetime import datetime
 
 from app.models.agent import Agent
 from app.core.llm_service import LLMService
+from app.core.embedding_service import EmbeddingService
+from app.services.memory_storage import RedisMemoryStorage
+
+# Functions and constants the calculator tool may use
+_CALCULATOR_FUNCTIONS = {
+    "abs": abs, "round": round, "min": min, "max": max,
+    "sqrt": math.sqrt, "exp": math.exp, "log": math.log, "log10": math.log10,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan,
+    "floor": math.floor, "ceil": math.ceil
+}
+_CALCULATOR_NAMES = {**_CALCULATOR_FUNCTIONS, "pi": math.pi, "e": math.e}
+
+# Arithmetic syntax the calculator tool accepts
+_CALCULATOR_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.UAdd, ast.USub
+)
+_CALCULATOR_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+    ast.Pow: operator.pow, ast.UAdd: operator.pos, ast.USub: operator.neg
+}
+# Largest integer (in bits, about 1200 digits) the calculator will build
+_MAX_INT_BITS = 4096
+
+def _validate_expression(tree: ast.AST) -> None:
+    """Reject anything in a parsed expression beyond plain arithmetic on allowed names"""
+    for node in ast.walk(tree):
+        if not isinstance(node, _CALCULATOR_NODES):
+            raise ValueError(f"unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, complex)):
+            raise ValueError(f"unsupported value: {node.value!r}")
+        if isinstance(node, ast.Name) and node.id not in _CALCULATOR_NAMES:
+            raise ValueError(f"unknown name: {node.id}")
+        if isinstance(node, ast.Call) and (
+                not isinstance(node.func, ast.Name)
+                or node.func.id not in _CALCULATOR_FUNCTIONS
+                or node.keywords):
+            raise ValueError("only calls to math functions are allowed")
+
+@functools.lru_cache(maxsize=1024)
+def _parse_expression(expression: str) -> ast.Expression:
+    """Parse and validate a calculator expression, caching the tree"""
+    tree = ast.parse(expression.strip(), mode="eval")
+    _validate_expression(tree)
+    return tree
+
+def _check_magnitude(value):
+    """Reject integers too large for the calculator"""
+    if isinstance(value, int) and value.bit_length() > _MAX_INT_BITS:
+        raise ValueError(f"numbers must fit in {_MAX_INT_BITS} bits")
+    return value
+
+def _evaluate(node: ast.AST):
+    """
+    Evaluate a validated calculator expression tree.
+    Integer powers and products are sized before they are computed, so no
+    expression (e.g. nested powers) can tie up the process building a huge number.
+    """
+    if isinstance(node, ast.Expression):
+        return _evaluate(node.body)
+    if isinstance(node, ast.Constant):
+        return _check_magnitude(node.value)
+    if isinstance(node, ast.Name):
+        return _CALCULATOR_NAMES[node.id]
+    if isinstance(node, ast.UnaryOp):
+        return _CALCULATOR_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.Call):
+        args = [_evaluate(arg) for arg in node.args]
+        return _check_magnitude(_CALCULATOR_FUNCTIONS[node.func.id](*args))
+    
+    left, right = _evaluate(node.left), _evaluate(node.right)
+    if isinstance(left, int) and isinstance(right, int):
+        # |left| ** right has at least (bits(left) - 1) * right bits
+        if isinstance(node.op, ast.Pow) and right > 0 and (abs(left).bit_length() - 1) * right > _MAX_INT_BITS:
+            raise ValueError(f"numbers must fit in {_MAX_INT_BITS} bits")
+        if isinstance(node.op, ast.Mult) and left.bit_length() + right.bit_length() > _MAX_INT_BITS + 1:
+            raise ValueError(f"numbers must fit in {_MAX_INT_BITS} bits")
+    return _check_magnitude(_CALCULATOR_OPERATORS[type(node.op)](left, right))
 
 class AgentService:
     """
     Service for managing multiple agents and their lifecycle.
     Similar to Letta's agent management system.
     """
-    def __init__(self, storage_dir: str = "./data/agents"):
+    def __init__(self, storage_dir: str = "./data/agents", 
+                 llm_service: Optional[LLMService] = None,
+                 embedding_service: Optional[EmbeddingService] = None,
+                 memory_storage: Optional[RedisMemoryStorage] = None,
+                 compact_every: int = 100,
+                 max_memories: int = 10_000,
+                 memory_half_life_days: float = 30.0):
         self.storage_dir = storage_dir
         self.active_agents: Dict[str, Agent] = {}
-        self.llm_service = LLMService()
+        self.llm_service = llm_service or LLMService()
+        self.embedding_service = embedding_service
+        # Optional Redis store for per-turn changes; without it they go to JSONL logs on disk
+        self.memory_storage = memory_storage
+        # Background saves still running, per agent
+        self._pending_saves: Dict[str, Set[asyncio.Task]] = {}
+        # One lock per agent serializes its saves, so a snapshot never races a log append
+        self._save_locks: Dict[str, asyncio.Lock] = {}
+        # One lock per agent shares a single load between concurrent first requests
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        # Compact an agent's memory every compact_every turns (0 disables it)
+        self.compact_every = compact_every
+        self.max_memories = max_memories
+        self.memory_half_life_days = memory_half_life_days
         
         # Create storage directory if it doesn't exist
         os.makedirs(self.storage_dir, exist_ok=True)
+        
+        # Summary of every stored agent, kept in memory so listing never reads agent files
+        self._index_path = os.path.join(self.storage_dir, "agents_index.json")
+        self._agent_index: Dict[str, Dict] = self._load_agent_index()
+    
+    def _load_agent_index(self) -> Dict[str, Dict]:
+        """
+        Load the agent index, reconciling it with the agent directories in storage.
+        Only agents missing from the saved index have their metadata read.
+        """
+        index = {}
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'rb') as f:
+                    index = orjson.loads(f.read())
+            except Exception as e:
+                print(f"Error loading agent index from {self._index_path}: {e}")
+        
+        agent_ids = {
+            item for item in os.listdir(self.storage_dir)
+            if os.path.exists(os.path.join(self.storage_dir, item, "metadata.json"))
+        }
+        changed = index.keys() != agent_ids
+        index = {agent_id: entry for agent_id, entry in index.items() if agent_id in agent_ids}
+        
+        for agent_id in agent_ids - index.keys():
+            entry = self._read_index_entry(agent_id)
+            if entry is not None:
+                index[agent_id] = entry
+        
+        if changed:
+            self._write_agent_index(index)
+        return index
+    
+    def _read_index_entry(self, agent_id: str) -> Optional[Dict]:
+        """Read the index entry of a stored agent from its metadata, or None if it isn't stored"""
+        metadata_path = os.path.join(self.storage_dir, agent_id, "metadata.json")
+        if not os.path.exists(metadata_path):
+            return None
+        try:
+            with open(metadata_path, 'rb') as f:
+                metadata = orjson.loads(f.read())
+            return self._index_entry(metadata)
+        except Exception as e:
+            print(f"Error loading agent metadata from {metadata_path}: {e}")
+            return None
+    
+    @staticmethod
+    def _index_entry(metadata: Dict) -> Dict:
+        """Pick the fields of an agent's metadata that are listed"""
+        return {
+            "agent_id": metadata["agent_id"],
+            "name": metadata["name"],
+            "persona": metadata["persona"],
+            "created_at": metadata.get("created_at")
+        }
+    
+    def _write_agent_index(self, index: Dict[str, Dict]) -> None:
+        """Write the agent index to storage, replacing the old file atomically"""
+        with open(f"{self._index_path}.tmp", 'wb') as f:
+            f.write(orjson.dumps(index))
+        os.replace(f"{self._index_path}.tmp", self._index_path)
     
     def create_agent(self, name: str, persona: str) -> Agent:
         """
@@ -37,7 +204,8 @@ class AgentService:
         agent = Agent(
             name=name,
             persona=persona,
-            llm_service=self.llm_service
+            llm_service=self.llm_service,
+            embedding_service=self.embedding_service
         )
         
         # Add to active agents
@@ -46,9 +214,17 @@ class AgentService:
         # Save agent
         agent.save(self.storage_dir)
         
+        self._agent_index[agent.agent_id] = {
+            "agent_id": agent.agent_id,
+            "name": agent.name,
+            "persona": agent.persona,
+            "created_at": datetime.now().isoformat()
+        }
+        self._write_agent_index(self._agent_index)
+        
         return agent
     
-    def get_agent(self, agent_id: str) -> Optional[Agent]:
+    async def get_agent(self, agent_id: str) -> Optional[Agent]:
         """
         Get an agent by ID, loading it if needed.
         
@@ -62,42 +238,44 @@ class AgentService:
         if agent_id in self.active_agents:
             return self.active_agents[agent_id]
         
-        # Try to load from storage
-        agent_path = os.path.join(self.storage_dir, agent_id)
-        if not os.path.exists(agent_path):
-            return None
-        
-        # Load agent
-        agent = Agent.load(agent_id, self.storage_dir)
-        self.active_agents[agent_id] = agent
-        
-        return agent
+        async with self._load_locks.setdefault(agent_id, asyncio.Lock()):
+            # Another request may have loaded it while we waited
+            if agent_id in self.active_agents:
+                return self.active_agents[agent_id]
+            
+            # Try to load from storage, including agents another process saved
+            # (another worker, or a script) since the index was loaded
+            if agent_id not in self._agent_index:
+                entry = await asyncio.to_thread(self._read_index_entry, agent_id)
+                if entry is None:
+                    return None
+                self._agent_index[agent_id] = entry
+                await asyncio.to_thread(self._write_agent_index, dict(self._agent_index))
+            
+            # Load agent without blocking the event loop
+            agent = await asyncio.to_thread(
+                Agent.load, agent_id, self.storage_dir,
+                llm_service=self.llm_service,
+                embedding_service=self.embedding_service
+            )
+            if self.memory_storage is not None:
+                await self.memory_storage.load_changes(agent)
+            
+            # Deleted while loading
+            if agent_id not in self._agent_index:
+                return None
+            return self.active_agents.setdefault(agent_id, agent)
     
-    def list_agents(self) -> List[Dict]:
+    async def list_agents(self) -> List[Dict]:
         """
         List all available agents.
         
         Returns:
-            List[Dict]: List of agent metadata
+            List[Dict]: List of agent summaries (agent_id, name, persona, created_at)
         """
-        agents = []
-        
-        # Check for agent directories
-        for item in os.listdir(self.storage_dir):
-            item_path = os.path.join(self.storage_dir, item)
-            metadata_path = os.path.join(item_path, "metadata.json")
-            
-            if os.path.isdir(item_path) and os.path.exists(metadata_path):
-                try:
-                    with open(metadata_path, 'r') as f:
-                        metadata = json.load(f)
-                    agents.append(metadata)
-                except Exception as e:
-                    print(f"Error loading agent metadata from {metadata_path}: {e}")
-        
-        return agents
+        return list(self._agent_index.values())
     
-    def delete_agent(self, agent_id: str) -> bool:
+    async def delete_agent(self, agent_id: str) -> bool:
         """
         Delete an agent.
         
@@ -107,35 +285,64 @@ class AgentService:
         Returns:
             bool: True if agent was deleted, False otherwise
         """
-        # Remove from active agents
-        if agent_id in self.active_agents:
-            del self.active_agents[agent_id]
+        # Remove from active agents, so background saves skip it from now on
+        agent = self.active_agents.pop(agent_id, None)
         
-        # Delete from storage
-        agent_path = os.path.join(self.storage_dir, agent_id)
-        if not os.path.exists(agent_path):
-            return False
+        if self._agent_index.pop(agent_id, None) is not None:
+            await asyncio.to_thread(self._write_agent_index, dict(self._agent_index))
         
-        try:
-            # Delete all files in the agent directory
-            for filename in os.listdir(agent_path):
-                file_path = os.path.join(agent_path, filename)
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
+        # Let saves already underway finish before deleting what they write
+        if agent is not None:
+            agent.cancel_reflections()
+        pending = self._pending_saves.pop(agent_id, None)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        async with self._save_lock(agent_id):
+            self._save_locks.pop(agent_id, None)
+            self._load_locks.pop(agent_id, None)
             
-            # Delete the directory
-            os.rmdir(agent_path)
-            return True
-        except Exception as e:
-            print(f"Error deleting agent {agent_id}: {e}")
-            return False
+            if self.memory_storage is not None:
+                await self.memory_storage.clear(agent_id)
+            
+            # Delete from storage
+            agent_path = os.path.join(self.storage_dir, agent_id)
+            if not os.path.exists(agent_path):
+                return False
+            
+            try:
+                # Delete the agent directory and everything in it without blocking the event loop
+                await asyncio.to_thread(shutil.rmtree, agent_path)
+                return True
+            except FileNotFoundError:
+                return False
+            except OSError as e:
+                print(f"Error deleting agent {agent_id}: {e}")
+                return False
+    
+    async def save_all_agents(self) -> None:
+        """Save full snapshots of all active agents to storage, compacting their logs"""
+        for agent in list(self.active_agents.values()):
+            async with self._save_lock(agent.agent_id):
+                await self._snapshot_agent(agent)
+    
+    def _save_lock(self, agent_id: str) -> asyncio.Lock:
+        """Get the lock that serializes an agent's saves"""
+        return self._save_locks.setdefault(agent_id, asyncio.Lock())
     
-    def save_all_agents(self) -> None:
-        """Save all active agents to storage"""
-        for agent in self.active_agents.values():
-            agent.save(self.storage_dir)
+    async def _snapshot_agent(self, agent: Agent) -> None:
+        """
+        Replace an agent's logged changes with a full snapshot.
+        Must be called holding the agent's save lock, so no change is logged meanwhile.
+        """
+        # Serialize on the event loop, where turns mutate the agent, and only write in a thread
+        snapshot = agent.snapshot(self.storage_dir)
+        await asyncio.to_thread(agent.write_snapshot, self.storage_dir, snapshot)
+        if self.memory_storage is not None:
+            # Everything stored so far was written under the lock, before the snapshot
+            await self.memory_storage.clear(agent.agent_id)
             
-    def generate_response(self, agent_id: str, user_input: str) -> str:
+    async def generate_response(self, agent_id: str, user_input: str) -> str:
         """
         Generate a response from an agent.
         
@@ -146,25 +353,87 @@ class AgentService:
         Returns:
             str: Agent's response, or error message if agent not found
         """
-        agent = self.get_agent(agent_id)
-        if not agent:
-            return f"Error: Agent with ID {agent_id} not found"
+        chunks = [chunk async for chunk in self.stream_response(agent_id, user_input)]
+        return "".join(chunks)
+    
+    async def stream_response(self, agent_id: str, user_input: str) -> AsyncIterator[str]:
+        """
+        Stream a response from an agent as it is generated.
         
-        response = agent.generate_response(user_input)
+        Args:
+            agent_id: ID of the agent to use
+            user_input: User's message
+            
+        Yields:
+            str: Chunks of the agent's response, or an error message if agent not found
+        """
+        agent = await self.get_agent(agent_id)
+        if not agent:
+            yield f"Error: Agent with ID {agent_id} not found"
+            return
         
-        # Save agent after interaction
-        agent.save(self.storage_dir)
+        async for chunk in agent.stream_response(user_input):
+            yield chunk
         
-        return response
+        # Log this turn's changes, once its background reflection lands
+        task = asyncio.create_task(self._save_after_reflection(agent))
+        pending = self._pending_saves.setdefault(agent_id, set())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    
+    async def _save_after_reflection(self, agent: Agent) -> None:
+        """Wait for an agent's pending reflections, then log its changes without blocking the event loop"""
+        await agent.wait_for_reflections()
+        async with self._save_lock(agent.agent_id):
+            # The agent may have been deleted meanwhile; saving now would recreate it
+            if self.active_agents.get(agent.agent_id) is not agent:
+                return
+            
+            turns = len(agent.conversation_history) // 2
+            if self.compact_every and turns % self.compact_every == 0:
+                await self._compact_agent(agent)
+                return
+            
+            if self.memory_storage is not None:
+                await self.memory_storage.save_changes(agent)
+            else:
+                changes = agent.take_changes()
+                await asyncio.to_thread(agent.write_changes, self.storage_dir, changes)
+    
+    async def _compact_agent(self, agent: Agent) -> None:
+        """Compact an agent's memory, then replace its logged changes with a full snapshot"""
+        # Compaction rebuilds the retrieval indexes, so run it on the event loop
+        # where no turn can read them half-built
+        evicted = agent.memory.compact(
+            max_items=self.max_memories,
+            half_life_days=self.memory_half_life_days
+        )
+        if evicted:
+            print(f"Compacted memory of agent {agent.agent_id}: evicted {evicted} memories")
+        await self._snapshot_agent(agent)
+    
+    async def wait_for_pending_saves(self) -> None:
+        """Wait for any agent saves still running in the background"""
+        pending = [task for tasks in self._pending_saves.values() for task in tasks]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def aclose(self) -> None:
+        """Finish background saves, compact agent snapshots and release shared clients"""
+        await self.wait_for_pending_saves()
+        await self.save_all_agents()
+        await self.llm_service.aclose()
+        if self.memory_storage is not None:
+            await self.memory_storage.aclose()
 
-    def create_default_tools(self, agent_id: str) -> None:
+    async def create_default_tools(self, agent_id: str) -> None:
         """
         Add default tools to an agent.
         
         Args:
             agent_id: ID of the agent to add tools to
         """
-        agent = self.get_agent(agent_id)
+        agent = await self.get_agent(agent_id)
         if not agent:
             return
         
@@ -181,7 +450,7 @@ class AgentService:
         # Calculator tool
         def calculator(expression: str) -> str:
             try:
-                return str(eval(expression))
+                return str(_evaluate(_parse_expression(expression)))
             except Exception as e:
                 return f"Error calculating {expression}: {str(e)}"
         
@@ -192,4 +461,5 @@ class AgentService:
         )
         
         # Save agent with new tools
-        agent.save(self.storage_dir) 
\ No newline at end of file
+        async with self._save_lock(agent_id):
+            await self._snapshot_agent(agent)
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""
+Redis-backed storage for agent memory.
+Keeps each turn's conversation messages and memory items in Redis, so
+per-turn persistence is a few in-memory writes made durable by Redis
+(RDB/AOF) rather than disk JSON serialization.
+"""
+
+from typing import List
+
+import orjson
+
+from app.models.agent import Agent
+
+class RedisMemoryStorage:
+    """
+    Stores agent changes made since the last on-disk snapshot:
+    
+    - agent:{id}:history          list of conversation messages
+    - agent:{id}:mem:{memory_id}  hash with the memory type and item data
+    - agent:{id}:order            list of memory IDs in the order they were added
+    """
+    def __init__(self, url: str = "redis://localhost:6379/0", max_connections: int = 50):
+        """
+        Initialize the storage with a shared connection pool.
+        
+        Args:
+            url: Redis connection URL
+            max_connections: Size of the connection pool
+        """
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise ImportError(
+                "Redis memory storage requires the redis package. "
+                "Install it with: pip install redis"
+            ) from e
+        
+        self.redis = redis.from_url(url, max_connections=max_connections)
+    
+    async def aclose(self) -> None:
+        """Close the connection pool"""
+        await self.redis.aclose()
+    
+    def _key(self, agent_id: str, *parts: str) -> str:
+        return ":".join(("agent", agent_id) + parts)
+    
+    async def save_changes(self, agent: Agent) -> None:
+        """
+        Write the messages and memories an agent added since its last save.
+        
+        Args:
+            agent: The agent whose changes to store
+        """
+        messages = agent.take_unsaved_history()
+        items = agent.memory.take_unsaved()
+        if not messages and not items:
+            return
+        
+        pipe = self.redis.pipeline(transaction=True)
+        if messages:
+            pipe.rpush(self._key(agent.agent_id, "history"), *(orjson.dumps(m) for m in messages))
+        for memory_type, item in items:
+            pipe.hset(self._key(agent.agent_id, "mem", item.id), mapping={
+                "memory_type": memory_type,
+                "data": orjson.dumps(item.to_dict())
+            })
+        if items:
+            pipe.rpush(self._key(agent.agent_id, "order"), *(item.id for _, item in items))
+        await pipe.execute()
+    
+    async def load_changes(self, agent: Agent) -> None:
+        """
+        Replay an agent's stored changes on top of its loaded snapshot.
+        
+        Args:
+            agent: The agent, freshly loaded from its snapshot
+        """
+        messages = await self.redis.lrange(self._key(agent.agent_id, "history"), 0, -1)
+        if messages:
+            agent.restore_history([orjson.loads(m) for m in messages])
+        
+        # Replay memories in the order they were added, as the JSONL log does
+        memory_ids = await self.redis.lrange(self._key(agent.agent_id, "order"), 0, -1)
+        await agent.memory.restore_items_async(await self._get_items(agent.agent_id, memory_ids))
+    
+    async def _get_items(self, agent_id: str, memory_ids: List[bytes]) -> List[tuple]:
+        """Fetch (memory type, item data) pairs for the given memory IDs in one round trip"""
+        if not memory_ids:
+            return []
+        
+        pipe = self.redis.pipeline(transaction=False)
+        for memory_id in memory_ids:
+            pipe.hmget(self._key(agent_id, "mem", memory_id.decode()), "memory_type", "data")
+        return [
+            (memory_type.decode(), orjson.loads(data))
+            for memory_type, data in await pipe.execute()
+            if data is not None
+        ]
+    
+    async def clear(self, agent_id: str) -> None:
+        """
+        Remove an agent's stored changes, e.g. once a snapshot includes them.
+        
+        Args:
+            agent_id: ID of the agent
+        """
+        memory_ids = await self.redis.lrange(self._key(agent_id, "order"), 0, -1)
+        keys = [self._key(agent_id, "history"), self._key(agent_id, "order")]
+        keys.extend({self._key(agent_id, "mem", memory_id.decode()) for memory_id in memory_ids})
+        await self.redis.delete(*keys)
\ No newline at end of file
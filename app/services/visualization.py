@@ -3,11 +3,66 @@ Visualization service for the Agent Development Environment (ADE).
 Provides functionality to visualize agent memory and reasoning.
 """
 
-import json
-from typing import Dict, List, Any, Optional
+import orjson
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Any, Optional, Tuple
 import os
-from datetime import datetime
+from pathlib import Path
+from datetime import datetime, timezone
+import heapq
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter, itemgetter
+
+from app.models.memory import MemoryItem
+
+# Threads used to read visualization files in parallel
+_MAX_READ_WORKERS = 8
+
+# File extension of each supported storage format
+_EXTENSIONS = {"json": ".json", "msgpack": ".msgpack"}
+
+# Log of visualizations appended in batch mode, one per agent directory
+_BATCH_LOG = "visualizations.jsonl"
+
+# Fields of each memory type shown in a memory visualization, after its id
+_FACT_KEYS = ("id", "content", "importance", "created_at", "metadata")
+_FACT_FIELDS = attrgetter(*_FACT_KEYS[1:])
+_CONVERSATION_KEYS = ("id", "content", "sender", "receiver", "importance", "created_at", "metadata")
+_CONVERSATION_FIELDS = attrgetter(*_CONVERSATION_KEYS[1:])
+_REFLECTION_KEYS = ("id", "content", "related_memories", "importance", "created_at", "metadata")
+_REFLECTION_FIELDS = attrgetter(*_REFLECTION_KEYS[1:])
+
+def _now() -> Tuple[datetime, int]:
+    """Read the clock once, as a UTC datetime and as integer nanoseconds since the epoch"""
+    created_at_ns = time.time_ns()
+    return datetime.fromtimestamp(created_at_ns / 1e9, timezone.utc), created_at_ns
+
+def _iso_to_ns(created_at: Optional[str]) -> int:
+    """Convert an ISO created_at to nanoseconds since the epoch, or 0 if it's missing or invalid"""
+    try:
+        return int(datetime.fromisoformat(created_at).timestamp() * 1e9)
+    except (TypeError, ValueError):
+        return 0
+
+def _msgpack():
+    """Import msgpack, which is only needed for visualizations in msgpack format"""
+    try:
+        import msgpack
+    except ImportError as e:
+        raise ImportError(
+            "The msgpack visualization format requires msgpack. "
+            "Install it with: pip install msgpack"
+        ) from e
+    return msgpack
+
+def _msgpack_default(obj: Any) -> Any:
+    """Encode the values msgpack has no type for as strings, the same way orjson does"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    raise TypeError(f"Type is not msgpack serializable: {type(obj).__name__}")
 
 class ADEVisualization:
     """
@@ -16,88 +71,147 @@ class ADEVisualization:
     For this demo, we'll generate JSON that could be consumed by a frontend.
     """
     
-    def __init__(self, output_dir: str = "./data/visualizations"):
-        """Initialize the visualization service"""
-        self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
+    def __init__(self, output_dir: str = "./data/visualizations", format: str = "json",
+                 batch: bool = False):
+        """
+        Initialize the visualization service.
+        
+        Args:
+            output_dir: Directory to save visualizations in
+            format: Format to save new visualizations in: "json", or the more
+                compact "msgpack" for visualizations only read by programs
+            batch: Append new visualizations as JSON lines to one log per agent
+                and type, kept open between saves, instead of writing a file for
+                each. Call close() when done
+        """
+        if format not in _EXTENSIONS:
+            raise ValueError(f"Unknown visualization format {format!r}, expected one of {sorted(_EXTENSIONS)}")
+        if format == "msgpack":
+            if batch:
+                raise ValueError("Batch mode stores visualizations as JSON lines; use format=\"json\"")
+            _msgpack()
+        self.format = format
+        self.batch = batch
+        # Open batch logs by path
+        self._handles: Dict[Path, BinaryIO] = {}
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Visualizations are stored as {viz_type}/{agent_id}/{visualization_id}.{json|msgpack},
+        # or appended to {viz_type}/{agent_id}/visualizations.jsonl in batch mode
+        self._migrate_flat_files()
+        
+        # get_visualizations results by (agent_id, viz_type, limit), with the mtimes of
+        # the directories they were read from; adding a file changes its directory's mtime
+        self._cache: Dict[Tuple[Optional[str], Optional[str], Optional[int]], Tuple[Tuple, List[Dict]]] = {}
+    
+    def _migrate_flat_files(self) -> None:
+        """Move visualizations saved directly in output_dir by older versions into their directories"""
+        with os.scandir(self.output_dir) as entries:
+            flat_files = [entry for entry in entries if entry.name.endswith('.json') and "_" in entry.name]
+        
+        for entry in flat_files:
+            viz_type, visualization_id = entry.name[:-len('.json')].split("_", 1)
+            try:
+                with open(entry.path, 'rb') as f:
+                    agent_id = orjson.loads(f.read())["agent_id"]
+                directory = self.output_dir / viz_type / agent_id
+                directory.mkdir(parents=True, exist_ok=True)
+                os.replace(entry.path, directory / f"{visualization_id}.json")
+            except Exception as e:
+                print(f"Error moving visualization {entry.path}: {e}")
     
     def visualize_agent_memory(self, agent_memory: Any) -> Dict:
         """
         Generate a visualization of an agent's memory.
+        The memory items are streamed to the visualization file as they are
+        converted, so the full visualization is never held in memory.
         
         Args:
             agent_memory: The agent's memory object
             
         Returns:
-            Dict: Visualization data that could be rendered by a frontend
+            Dict: Summary of the saved visualization (agent_id, memory_stats,
+                visualization_id, created_at, created_at_ns); load the items with
+                get_visualizations
         """
-        # Extract memory items and organize by type
-        memory_viz = {
+        created_at, created_at_ns = _now()
+        summary = {
             "agent_id": agent_memory.agent_id,
-            "facts": [],
-            "conversations": [],
-            "reflections": [],
-            "memory_stats": {
-                "total_items": 0,
-                "facts_count": len(agent_memory.facts),
-                "conversations_count": len(agent_memory.conversations),
-                "reflections_count": len(agent_memory.reflections)
-            },
-            "visualization_id": str(uuid.uuid4()),
-            "created_at": datetime.now().isoformat()
+            "memory_stats": {},
+            "visualization_id": uuid.uuid4(),
+            "created_at": created_at,
+            "created_at_ns": created_at_ns
         }
         
-        # Process facts
-        for fact_id, fact in agent_memory.facts.items():
-            memory_viz["facts"].append({
-                "id": fact_id,
-                "content": fact.content,
-                "importance": fact.importance,
-                "created_at": fact.created_at.isoformat() if hasattr(fact.created_at, 'isoformat') else fact.created_at,
-                "metadata": fact.metadata
-            })
-        
-        # Process conversations
-        for conv_id, conv in agent_memory.conversations.items():
-            memory_viz["conversations"].append({
-                "id": conv_id,
-                "content": conv.content,
-                "sender": conv.sender,
-                "receiver": conv.receiver,
-                "importance": conv.importance,
-                "created_at": conv.created_at.isoformat() if hasattr(conv.created_at, 'isoformat') else conv.created_at,
-                "metadata": conv.metadata
-            })
-        
-        # Process reflections
-        for refl_id, refl in agent_memory.reflections.items():
-            memory_viz["reflections"].append({
-                "id": refl_id,
-                "content": refl.content,
-                "related_memories": refl.related_memories,
-                "importance": refl.importance,
-                "created_at": refl.created_at.isoformat() if hasattr(refl.created_at, 'isoformat') else refl.created_at,
-                "metadata": refl.metadata
-            })
-        
-        # Update total count
-        memory_viz["memory_stats"]["total_items"] = (
-            memory_viz["memory_stats"]["facts_count"] +
-            memory_viz["memory_stats"]["conversations_count"] +
-            memory_viz["memory_stats"]["reflections_count"]
+        # Save visualization data, filling in the stats as the items are written
+        self._save_visualization(self._stream_memory(agent_memory, summary), "memory", summary)
+        
+        return summary
+    
+    def _stream_memory(self, agent_memory: Any, summary: Dict) -> Iterator[bytes]:
+        """
+        Serialize an agent's memory as a memory visualization, piece by piece.
+        
+        Args:
+            agent_memory: The agent's memory object
+            summary: Visualization summary; its memory_stats are filled in as items are counted
+            
+        Yields:
+            bytes: Successive pieces of the visualization, in the service's format
+        """
+        sections = (
+            ("facts", agent_memory.facts, _FACT_KEYS, _FACT_FIELDS),
+            ("conversations", agent_memory.conversations, _CONVERSATION_KEYS, _CONVERSATION_FIELDS),
+            ("reflections", agent_memory.reflections, _REFLECTION_KEYS, _REFLECTION_FIELDS)
         )
         
-        # Save visualization data
-        self._save_visualization(memory_viz, "memory")
+        stats = summary["memory_stats"]
+        stats["total_items"] = 0
+        
+        if self.format == "msgpack":
+            # msgpack arrays are prefixed with their length, so count each section up front
+            packer = _msgpack().Packer(default=_msgpack_default)
+            yield packer.pack_map_header(8) + packer.pack("agent_id") + packer.pack(summary["agent_id"])
+            for section, items, keys, fields in sections:
+                count = len(items)
+                yield packer.pack(section) + packer.pack_array_header(count)
+                for item_id, item in items.items():
+                    yield packer.pack(dict(zip(keys, (item_id, *fields(item)))))
+                stats[f"{section}_count"] = count
+                stats["total_items"] += count
+            
+            yield (packer.pack("memory_stats") + packer.pack(stats)
+                   + packer.pack("visualization_id") + packer.pack(summary["visualization_id"])
+                   + packer.pack("created_at") + packer.pack(summary["created_at"])
+                   + packer.pack("created_at_ns") + packer.pack(summary["created_at_ns"]))
+            return
         
-        return memory_viz
+        yield b'{"agent_id":' + orjson.dumps(summary["agent_id"])
+        for section, items, keys, fields in sections:
+            yield b',"' + section.encode() + b'":['
+            count = 0
+            for item_id, item in items.items():
+                if count:
+                    yield b","
+                # created_at must be a datetime, which orjson serializes itself
+                yield orjson.dumps(dict(zip(keys, (item_id, *fields(item)))))
+                count += 1
+            yield b"]"
+            stats[f"{section}_count"] = count
+            stats["total_items"] += count
+        
+        yield (b',"memory_stats":' + orjson.dumps(stats)
+               + b',"visualization_id":' + orjson.dumps(summary["visualization_id"])
+               + b',"created_at":' + orjson.dumps(summary["created_at"])
+               + b',"created_at_ns":' + orjson.dumps(summary["created_at_ns"]) + b"}")
     
     def visualize_agent_reasoning(self, 
                                  agent_id: str, 
                                  user_input: str, 
                                  response: str, 
                                  context: str,
-                                 memory_items: List) -> Dict:
+                                 memory_items: List[MemoryItem]) -> Dict:
         """
         Generate a visualization of an agent's reasoning process.
         
@@ -106,77 +220,251 @@ class ADEVisualization:
             user_input: The user's input message
             response: The agent's response
             context: The context used for generation
-            memory_items: The memory items used in the response
+            memory_items: The memory items used in the response; every MemoryItem has to_dict
             
         Returns:
             Dict: Visualization data that could be rendered by a frontend
         """
         # Create reasoning visualization
+        created_at, created_at_ns = _now()
         reasoning_viz = {
             "agent_id": agent_id,
             "user_input": user_input,
             "agent_response": response,
             "context_used": context,
-            "memory_items_used": [item.to_dict() if hasattr(item, 'to_dict') else str(item) for item in memory_items],
-            "visualization_id": str(uuid.uuid4()),
-            "created_at": datetime.now().isoformat()
+            "memory_items_used": [item.to_dict() for item in memory_items],
+            "visualization_id": uuid.uuid4(),
+            "created_at": created_at,
+            "created_at_ns": created_at_ns
         }
         
         # Save visualization data
-        self._save_visualization(reasoning_viz, "reasoning")
+        if self.format == "msgpack":
+            data = _msgpack().packb(reasoning_viz, default=_msgpack_default)
+        else:
+            data = orjson.dumps(reasoning_viz)
+        self._save_visualization([data], "reasoning", reasoning_viz)
         
         return reasoning_viz
     
-    def _save_visualization(self, data: Dict, viz_type: str) -> None:
+    def _save_visualization(self, chunks: Iterable[bytes], viz_type: str, data: Dict) -> None:
         """
-        Save visualization data to a file.
+        Save visualization data to a file, writing it as it is produced.
         
         Args:
-            data: Visualization data
+            chunks: Serialized visualization data, in pieces
             viz_type: Type of visualization (memory, reasoning, etc.)
+            data: Visualization data or summary, providing the agent_id and visualization_id
         """
-        filename = f"{viz_type}_{data['visualization_id']}.json"
-        filepath = os.path.join(self.output_dir, filename)
+        directory = self.output_dir / viz_type / data["agent_id"]
+        if self.batch:
+            self._append_to_log(chunks, directory)
+            return
+        
+        directory.mkdir(parents=True, exist_ok=True)
+        filepath = directory / f"{data['visualization_id']}{_EXTENSIONS[self.format]}"
+        tmp_path = filepath.with_name(f"{filepath.name}.tmp")
         
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Files are written compact, since they are mostly read by programs (use
+        # pretty_print to inspect one); orjson writes datetimes and UUIDs as strings
+        # itself. Write to a temporary file and swap it in, so readers never see a
+        # partial visualization
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        tmp_path.replace(filepath)
+        self._cache.clear()
     
-    def get_visualizations(self, agent_id: Optional[str] = None, viz_type: Optional[str] = None) -> List[Dict]:
+    def _append_to_log(self, chunks: Iterable[bytes], directory: Path) -> None:
+        """
+        Append a visualization to a directory's batch log as one JSON line.
+        
+        Args:
+            chunks: Serialized visualization data, in pieces
+            directory: Directory of the visualization's agent and type
+        """
+        # Serialize the whole line before touching the log, so a visualization that
+        # fails to serialize never leaves a partial line for the next one to join
+        line = b"".join(chunks) + b"\n"
+        
+        path = directory / _BATCH_LOG
+        handle = self._handles.get(path)
+        if handle is None:
+            directory.mkdir(parents=True, exist_ok=True)
+            handle = self._handles[path] = open(path, 'ab')
+        
+        # Compact JSON never contains a raw newline, so each visualization is one line
+        handle.write(line)
+        self._cache.clear()
+    
+    def flush(self) -> None:
+        """Write buffered batch-mode visualizations to disk"""
+        for handle in self._handles.values():
+            handle.flush()
+    
+    def close(self) -> None:
+        """Flush and close the batch logs"""
+        for handle in self._handles.values():
+            handle.close()
+        self._handles.clear()
+    
+    def get_visualizations(self, agent_id: Optional[str] = None, viz_type: Optional[str] = None,
+                           limit: Optional[int] = None) -> List[Dict]:
         """
         Get saved visualizations.
+        Only the directories matching the filters are read, and with a limit
+        only the files of the most recent visualizations are parsed.
         
         Args:
             agent_id: Optional filter by agent ID
             viz_type: Optional filter by visualization type
+            limit: Optional maximum number of visualizations to return
             
         Returns:
-            List[Dict]: List of visualization data
+            List[Dict]: List of visualization data, most recent first
         """
-        visualizations = []
+        self.flush()
+        fingerprint, directories = self._find_directories(agent_id, viz_type)
+        cached = self._cache.get((agent_id, viz_type, limit))
+        if cached is not None and cached[0] == fingerprint:
+            return list(cached[1])
         
-        for filename in os.listdir(self.output_dir):
-            if not filename.endswith('.json'):
-                continue
-                
-            # Check if the filename matches the requested type
-            if viz_type and not filename.startswith(f"{viz_type}_"):
-                continue
-                
-            filepath = os.path.join(self.output_dir, filename)
+        entries = []
+        for directory in directories:
+            with os.scandir(directory) as it:
+                entries.extend(
+                    entry for entry in it
+                    if entry.name.endswith(tuple(_EXTENSIONS.values())) or entry.name == _BATCH_LOG
+                )
+        
+        if limit is not None:
+            # Each file is written once when its visualization is created, so
+            # the newest files hold the most recent visualizations. Batch logs
+            # hold many, and are always read
+            logs = [entry for entry in entries if entry.name == _BATCH_LOG]
+            files = [entry for entry in entries if entry.name != _BATCH_LOG]
+            entries = logs + heapq.nlargest(limit, files, key=lambda entry: entry.stat().st_mtime_ns)
+        
+        # Overlap the file reads, which release the GIL while waiting on the disk
+        paths = [entry.path for entry in entries]
+        if len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(_MAX_READ_WORKERS, len(paths))) as pool:
+                loaded = list(pool.map(self._load_file, paths))
+        else:
+            loaded = [self._load_file(path) for path in paths]
+        visualizations = [data for file_data in loaded for data in file_data]
+        
+        # Sort by creation time, most recent first, comparing integers. Files
+        # from older versions only have the ISO created_at
+        for visualization in visualizations:
+            if "created_at_ns" not in visualization:
+                visualization["created_at_ns"] = _iso_to_ns(visualization.get("created_at"))
+        visualizations.sort(key=itemgetter("created_at_ns"), reverse=True)
+        if limit is not None:
+            del visualizations[limit:]
+        
+        self._cache[(agent_id, viz_type, limit)] = (fingerprint, visualizations)
+        return list(visualizations)
+    
+    def pretty_print(self, path: str) -> str:
+        """
+        Format a saved visualization file as indented JSON, for reading it by hand.
+        
+        Args:
+            path: Path of the visualization file, in either format
+            
+        Returns:
+            str: The visualization as indented JSON
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if path.endswith(_EXTENSIONS["msgpack"]):
+            visualization = _msgpack().unpackb(data)
+        else:
+            visualization = orjson.loads(data)
+        return orjson.dumps(visualization, option=orjson.OPT_INDENT_2).decode()
+    
+    @staticmethod
+    def _load_file(path: str) -> List[Dict]:
+        """
+        Parse a visualization file, or every visualization in a batch log.
+        
+        Args:
+            path: Path of the visualization file
             
+        Returns:
+            List[Dict]: Visualization data, empty if the file can't be read
+        """
+        try:
+            if path.endswith(_BATCH_LOG):
+                visualizations = []
+                with open(path, 'rb') as f:
+                    for line in f:
+                        try:
+                            visualizations.append(orjson.loads(line))
+                        except orjson.JSONDecodeError:
+                            # A torn final line from an interrupted write
+                            print(f"Warning: Skipping unreadable line in {path}")
+                return visualizations
+            
+            with open(path, 'rb') as f:
+                data = f.read()
+            if path.endswith(_EXTENSIONS["msgpack"]):
+                return [_msgpack().unpackb(data)]
+            return [orjson.loads(data)]
+        except Exception as e:
+            print(f"Error loading visualization from {path}: {e}")
+            return []
+    
+    def _find_directories(self, agent_id: Optional[str], viz_type: Optional[str]) -> Tuple[Tuple, List[Path]]:
+        """
+        Find the directories holding visualizations that match the filters.
+        
+        Args:
+            agent_id: Optional filter by agent ID
+            viz_type: Optional filter by visualization type
+            
+        Returns:
+            Tuple[Tuple, List[Path]]: The mtime of every directory looked at and
+                the mtime and size of every batch log, which change whenever a
+                matching visualization is added or removed, and the matching directories
+        """
+        fingerprint = [(self.output_dir, self.output_dir.stat().st_mtime_ns)]
+        if viz_type:
+            type_dirs = [self.output_dir / viz_type]
+        else:
+            type_dirs = self._list_subdirectories(self.output_dir)
+        
+        directories = []
+        for type_dir in type_dirs:
             try:
-                with open(filepath, 'r') as f:
-                    data = json.load(f)
-                
-                # Filter by agent ID if specified
-                if agent_id and data.get("agent_id") != agent_id:
+                fingerprint.append((type_dir, type_dir.stat().st_mtime_ns))
+                if agent_id:
+                    agent_dirs = [type_dir / agent_id]
+                else:
+                    agent_dirs = self._list_subdirectories(type_dir)
+            except FileNotFoundError:
+                continue
+            
+            for agent_dir in agent_dirs:
+                try:
+                    fingerprint.append((agent_dir, agent_dir.stat().st_mtime_ns))
+                except FileNotFoundError:
                     continue
-                    
-                visualizations.append(data)
-            except Exception as e:
-                print(f"Error loading visualization from {filepath}: {e}")
-        
-        # Sort by creation time, most recent first
-        visualizations.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+                directories.append(agent_dir)
+                
+                # Appending to a batch log changes the log, not its directory
+                try:
+                    log_stat = (agent_dir / _BATCH_LOG).stat()
+                    fingerprint.append((log_stat.st_mtime_ns, log_stat.st_size))
+                except FileNotFoundError:
+                    pass
         
-        return visualizations 
\ No newline at end of file
+        return tuple(fingerprint), directories
+    
+    @staticmethod
+    def _list_subdirectories(directory: Path) -> List[Path]:
+        """List a directory's subdirectories, in name order"""
+        # scandir rather than iterdir, for is_dir() without a stat per entry
+        with os.scandir(directory) as entries:
+            return sorted(directory / entry.name for entry in entries if entry.is_dir())
\ No newline at end of file
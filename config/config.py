@@ -3,29 +3,73 @@ Application configuration settings.
 """
 
 import os
+from dataclasses import dataclass
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+@dataclass(frozen=True, slots=True)
 class Config:
+    """Settings read once from the environment; use the CONFIG instance below."""
     # OpenAI Configuration
-    OPENAI_API_KEY = os.getenv("OPENAI_API")
-    DEFAULT_MODEL = "gpt-3.5-turbo"
+    OPENAI_API_KEY: Optional[str]
+    DEFAULT_MODEL: str
+    
+    # LLM request batching
+    LLM_BATCH_LATENCY_MS: float  # wait for a batch to fill
+    LLM_MAX_CONCURRENCY: int  # requests in flight
+    
+    # Memory Retrieval (sentence-transformers model name; unset = keyword matching)
+    EMBEDDING_MODEL: Optional[str]
+    
+    # Memory Compaction (every N turns, decay importance and keep the top memories)
+    MEMORY_COMPACT_EVERY: int  # 0 = never
+    MEMORY_MAX_ITEMS: int
+    MEMORY_HALF_LIFE_DAYS: float
+    
+    # Memory Storage (Redis URL for per-turn changes; unset = JSONL logs on disk)
+    REDIS_URL: Optional[str]
     
     # Application Settings
-    DEBUG = os.getenv("DEBUG", "False").lower() == "true"
-    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    DEBUG: bool
+    LOG_LEVEL: str
+    WORKERS: int  # server processes; agents are cached per process, so keep 1 unless requests for an agent always reach the same worker
     
     # API Settings
-    API_VERSION = "v1"
-    API_PREFIX = f"/api/{API_VERSION}"
+    API_VERSION: str
     
     # Rate Limiting
-    RATE_LIMIT = int(os.getenv("RATE_LIMIT", "100"))  # requests per minute
+    RATE_LIMIT: int  # requests per minute
+    
+    @property
+    def API_PREFIX(self) -> str:
+        return f"/api/{self.API_VERSION}"
     
     @classmethod
-    def validate(cls):
+    def from_env(cls) -> "Config":
+        """Read the settings from environment variables."""
+        return cls(
+            OPENAI_API_KEY=os.getenv("OPENAI_API"),
+            DEFAULT_MODEL="gpt-3.5-turbo",
+            LLM_BATCH_LATENCY_MS=float(os.getenv("LLM_BATCH_LATENCY_MS", "10")),
+            LLM_MAX_CONCURRENCY=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            EMBEDDING_MODEL=os.getenv("EMBEDDING_MODEL"),
+            MEMORY_COMPACT_EVERY=int(os.getenv("MEMORY_COMPACT_EVERY", "100")),
+            MEMORY_MAX_ITEMS=int(os.getenv("MEMORY_MAX_ITEMS", "10000")),
+            MEMORY_HALF_LIFE_DAYS=float(os.getenv("MEMORY_HALF_LIFE_DAYS", "30")),
+            REDIS_URL=os.getenv("REDIS_URL"),
+            DEBUG=os.getenv("DEBUG", "False").lower() == "true",
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+            WORKERS=int(os.getenv("WORKERS", "1")),
+            API_VERSION="v1",
+            RATE_LIMIT=int(os.getenv("RATE_LIMIT", "100"))
+        )
+    
+    def validate(self):
         """Validate required configuration settings."""
-        if not cls.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY is not set in environment variables. Set the OPENAI_API environment variable.") 
\ No newline at end of file
+        if not self.OPENAI_API_KEY:
+            raise ValueError("OPENAI_API_KEY is not set in environment variables. Set the OPENAI_API environment variable.")
+
+CONFIG = Config.from_env()
\ No newline at end of file
@@ -4,18 +4,16 @@ Simple demonstration of the agent system.
 
 import os
 import sys
-from dotenv import load_dotenv
+import asyncio
 
 # Add the project root to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Load environment variables
-load_dotenv()
-
+# Environment variables are loaded from .env when the app's config is imported
 from app.models.agent import Agent
 from app.models.memory import AgentMemory
 
-def main():
+async def main():
     """Run the demo"""
     print("=== Agent OS Demo ===")
     
@@ -60,10 +58,13 @@ def main():
         print(f"\n[User]: {message}")
         
         # Generate response
-        response = agent.generate_response(message)
+        response = await agent.generate_response(message)
         
         print(f"[Agent]: {response}")
         
+        # Let the background reflection on this exchange finish
+        await agent.wait_for_reflections()
+        
         # Show some memory stats after each exchange
         print(f"\nMemory stats after exchange {i+1}:")
         print(f"- Facts: {len(agent.memory.facts)}")
@@ -84,4 +85,4 @@ def main():
     print(f"- Reflections: {len(loaded_agent.memory.reflections)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    asyncio.run(main()) 
\ No newline at end of file
@@ -3,16 +3,21 @@ Script to run the FastAPI server.
 """
 
 import uvicorn
-from config.config import Config
+from config.config import CONFIG
 
 if __name__ == "__main__":
     # Validate configuration settings
-    Config.validate()
+    CONFIG.validate()
     
     # Run the server
     uvicorn.run(
         "app.api:app", 
         host="127.0.0.1", 
         port=8000, 
-        reload=Config.DEBUG
+        reload=CONFIG.DEBUG,
+        # uvloop and httptools when installed (uvicorn[standard]); plain asyncio when debugging
+        loop="asyncio" if CONFIG.DEBUG else "auto",
+        http="auto",
+        # Reloading needs a single process
+        workers=1 if CONFIG.DEBUG else CONFIG.WORKERS
     ) 
\ No newline at end of file
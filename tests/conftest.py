@@ -0,0 +1,8 @@
+"""
+Shared test setup.
+"""
+
+import os
+
+# Run the LLM service in its mock mode, so tests never call the API
+os.environ.setdefault("OPENAI_API", "sk-your-key")
\ No newline at end of file
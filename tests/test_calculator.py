@@ -0,0 +1,55 @@
+"""
+Tests for the calculator tool's expression evaluator.
+"""
+
+import time
+
+import pytest
+
+from app.services.agent_service import _evaluate, _parse_expression
+
+def calculate(expression: str):
+    return _evaluate(_parse_expression(expression))
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2 + 3 * 4", 14),
+    ("(1 + 2) / 4", 0.75),
+    ("7 // 2 + 7 % 2", 4),
+    ("-2 ** -1", -0.5),
+    ("2 ** 10", 1024),
+    ("sqrt(16) + max(1, 2, 3)", 7.0),
+    ("round(pi, 2)", 3.14),
+    ("floor(e)", 2),
+    ("10 ** 100 * 10 ** 100", 10 ** 200),
+])
+def test_allowed_expressions(expression, expected):
+    assert calculate(expression) == expected
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "(lambda: 1)()",
+    "x + 1",
+    "'a' * 3",
+    "[1, 2][0]",
+    "(1).__class__",
+    "abs(x=1)",
+    "1 if 1 else 2",
+    "1 << 10000",
+])
+def test_rejected_syntax(expression):
+    with pytest.raises(ValueError):
+        _parse_expression(expression)
+
+@pytest.mark.parametrize("expression", [
+    "(((10 ** 100) ** 100) ** 100) ** 10",
+    "9 ** 9 ** 9",
+    "2 ** 4096",
+    "(2 ** 4000) * (2 ** 4000)",
+    "max(2 ** 2000, 3) ** 3",
+])
+def test_rejects_huge_integers_quickly(expression):
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        calculate(expression)
+    assert time.perf_counter() - start < 0.5
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Tests for agent persistence: snapshots, append-only logs, compaction and Redis storage.
+"""
+
+import asyncio
+import os
+import zlib
+from datetime import datetime, timedelta
+
+import fakeredis
+import numpy as np
+
+from app.core.llm_service import LLMService
+from app.models.agent import Agent
+from app.models.memory import AgentMemory
+from app.services.agent_service import AgentService
+from app.services.memory_storage import RedisMemoryStorage
+
+class FakeEmbeddingService:
+    """Deterministic bag-of-words embeddings, so tests don't load a model"""
+    dimension = 64
+    
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in text.lower().split():
+                vectors[i, zlib.crc32(token.encode()) % self.dimension] += 1
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+        return vectors
+
+def state(agent: Agent):
+    """What a reloaded agent must reproduce: history, memories and their row order"""
+    return (
+        agent.conversation_history,
+        {memory_id: item.to_dict() for memory_id, item in agent.memory._by_id.items()},
+        agent.memory._row_ids
+    )
+
+def run_turns(agent: Agent, *messages: str) -> None:
+    async def turns():
+        for message in messages:
+            await agent.generate_response(message)
+        await agent.wait_for_reflections()
+    asyncio.run(turns())
+
+def make_agent() -> Agent:
+    agent = Agent(name="Tester", persona="I test things.", llm_service=LLMService())
+    agent.memory.add_fact("fact_1", "The Earth orbits the Sun", importance=0.9)
+    return agent
+
+def test_snapshot_round_trip(tmp_path):
+    agent = make_agent()
+    run_turns(agent, "tell me about the planet", "and the water?")
+    agent.save(str(tmp_path))
+    
+    loaded = Agent.load(agent.agent_id, str(tmp_path))
+    assert state(loaded) == state(agent)
+    assert list(loaded._recent_lines) == list(agent._recent_lines)
+    assert not os.path.exists(tmp_path / agent.agent_id / "history.jsonl")
+    assert not os.path.exists(tmp_path / agent.agent_id / "memory.jsonl")
+
+def test_logged_changes_replay_on_snapshot(tmp_path):
+    agent = make_agent()
+    agent.save(str(tmp_path))
+    for message in ("first", "second"):
+        run_turns(agent, message)
+        agent.write_changes(str(tmp_path), agent.take_changes())
+    
+    assert os.path.exists(tmp_path / agent.agent_id / "memory.jsonl")
+    assert state(Agent.load(agent.agent_id, str(tmp_path))) == state(agent)
+
+def test_torn_final_log_lines_are_skipped(tmp_path):
+    agent = make_agent()
+    agent.save(str(tmp_path))
+    run_turns(agent, "hello")
+    agent.write_changes(str(tmp_path), agent.take_changes())
+    expected = state(agent)
+    
+    # An interrupted append leaves half a line at the end of each log
+    agent_path = tmp_path / agent.agent_id
+    with open(agent_path / "history.jsonl", 'ab') as f:
+        f.write(b'{"role": "user", "cont')
+    with open(agent_path / "memory.jsonl", 'ab') as f:
+        f.write(b'{"memory_type": "fact", "id"')
+    
+    assert state(Agent.load(agent.agent_id, str(tmp_path))) == expected
+
+def test_snapshot_keeps_changes_logged_after_it(tmp_path):
+    agent = make_agent()
+    agent.save(str(tmp_path))
+    run_turns(agent, "before the snapshot")
+    agent.write_changes(str(tmp_path), agent.take_changes())
+    
+    # A turn is logged while the snapshot is being written
+    snapshot = agent.snapshot(str(tmp_path))
+    run_turns(agent, "during the snapshot")
+    agent.write_changes(str(tmp_path), agent.take_changes())
+    agent.write_snapshot(str(tmp_path), snapshot)
+    
+    loaded = Agent.load(agent.agent_id, str(tmp_path))
+    assert state(loaded) == state(agent)
+    assert len(loaded.conversation_history) == 4
+
+def test_compaction_evicts_least_important_and_rebuilds_indexes():
+    now = datetime(2025, 1, 31)
+    memory = AgentMemory("agent", embedding_service=FakeEmbeddingService())
+    memory.add_fact("old", "ancient history fades", importance=1.0, created_at=now - timedelta(days=30))
+    memory.add_fact("keep_a", "the sky is blue", importance=0.9, created_at=now)
+    memory.add_fact("minor", "a passing remark", importance=0.2, created_at=now)
+    memory.add_fact("keep_b", "water is wet", importance=0.8, created_at=now)
+    
+    evicted = memory.compact(max_items=2, half_life_days=10, now=now)
+    
+    assert evicted == 2
+    # Survivors keep their original relative order, in contiguous rows
+    assert memory._row_ids == ["keep_a", "keep_b"]
+    assert memory._rows == {"keep_a": 0, "keep_b": 1}
+    assert set(memory.facts) == set(memory._by_id) == {"keep_a", "keep_b"}
+    assert list(memory._row_importance) == [0.9, 0.8]
+    assert all(rows <= {0, 1} for rows in memory._index.values())
+    assert memory._emb_size == 2
+    expected = FakeEmbeddingService().embed(["the sky is blue", "water is wet"])
+    assert np.allclose(memory._emb[:2], expected)
+    assert memory.get_relevant_memories("water", limit=1)[0].id == "keep_b"
+    
+    keyword_memory = AgentMemory("agent")
+    keyword_memory.add_fact("a", "blue sky", created_at=now)
+    keyword_memory.add_fact("b", "red sky", importance=0.001, created_at=now)
+    keyword_memory.compact(now=now)
+    assert [item.id for item in keyword_memory.get_relevant_memories("sky")] == ["a"]
+
+def test_compaction_decay_compounds():
+    created = datetime(2025, 1, 1)
+    once = AgentMemory("agent")
+    once.add_fact("f", "fact", importance=1.0, created_at=created)
+    once.compact(half_life_days=10, now=created + timedelta(days=20))
+    
+    twice = AgentMemory("agent")
+    twice.add_fact("f", "fact", importance=1.0, created_at=created)
+    twice.compact(half_life_days=10, now=created + timedelta(days=10))
+    twice.compact(half_life_days=10, now=created + timedelta(days=20))
+    
+    assert once.facts["f"].importance == twice.facts["f"].importance == 0.25
+
+def redis_storage() -> RedisMemoryStorage:
+    storage = RedisMemoryStorage.__new__(RedisMemoryStorage)
+    storage.redis = fakeredis.FakeAsyncRedis()
+    return storage
+
+def test_redis_changes_round_trip(tmp_path):
+    async def scenario():
+        storage = redis_storage()
+        service = AgentService(storage_dir=str(tmp_path), memory_storage=storage, compact_every=0)
+        agent = service.create_agent("Tester", "I test things.")
+        for message in ("tell me about the planet", "and the water?"):
+            await service.generate_response(agent.agent_id, message)
+        await service.wait_for_pending_saves()
+        
+        # The changes live in Redis, not in the logs
+        assert not os.path.exists(tmp_path / agent.agent_id / "memory.jsonl")
+        assert await storage.redis.llen(f"agent:{agent.agent_id}:history") == 4
+        
+        reloaded = await AgentService(str(tmp_path), memory_storage=storage).get_agent(agent.agent_id)
+        assert state(reloaded) == state(agent)
+        
+        # A full snapshot covers the stored changes, so they are cleared
+        await service.save_all_agents()
+        assert await storage.redis.keys(f"agent:{agent.agent_id}:*") == []
+        assert state(Agent.load(agent.agent_id, str(tmp_path))) == state(agent)
+    
+    asyncio.run(scenario())
+
+def test_redis_replays_memories_in_insertion_order(tmp_path):
+    async def scenario():
+        storage = redis_storage()
+        agent = make_agent()
+        agent.save(str(tmp_path))
+        agent.memory.add_fact("low", "low importance", importance=0.1)
+        agent.memory.add_fact("high", "high importance", importance=1.0)
+        agent.memory.add_fact("mid", "mid importance", importance=0.5)
+        await storage.save_changes(agent)
+        
+        loaded = Agent.load(agent.agent_id, str(tmp_path))
+        await storage.load_changes(loaded)
+        assert loaded.memory._row_ids == ["fact_1", "low", "high", "mid"]
+        
+        await storage.clear(agent.agent_id)
+        assert await storage.redis.keys("*") == []
+    
+    asyncio.run(scenario())
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Tests for saving and reading visualizations.
+"""
+
+import time
+
+import orjson
+
+from app.models.memory import AgentMemory
+from app.services.visualization import ADEVisualization
+
+def make_memory(agent_id: str) -> AgentMemory:
+    memory = AgentMemory(agent_id)
+    memory.add_fact("fact_1", "The Earth orbits the Sun")
+    memory.add_conversation("conv_1", "Tell me about the Earth", "user", agent_id)
+    memory.add_reflection("refl_1", "The user is curious about astronomy", ["conv_1"])
+    return memory
+
+def ids(visualizations):
+    return [str(visualization["visualization_id"]) for visualization in visualizations]
+
+def save_memory(viz: ADEVisualization, agent_id: str) -> str:
+    # Space the saves out, so every file gets its own modification time
+    time.sleep(0.01)
+    return str(viz.visualize_agent_memory(make_memory(agent_id))["visualization_id"])
+
+def save_reasoning(viz: ADEVisualization, agent_id: str) -> str:
+    time.sleep(0.01)
+    memory = make_memory(agent_id)
+    return str(viz.visualize_agent_reasoning(
+        agent_id, "hi", "hello", "context", list(memory._by_id.values())
+    )["visualization_id"])
+
+def test_filters_by_agent_and_type(tmp_path):
+    viz = ADEVisualization(str(tmp_path))
+    a_memory = save_memory(viz, "agent_a")
+    a_reasoning = save_reasoning(viz, "agent_a")
+    b_memory = save_memory(viz, "agent_b")
+    
+    assert ids(viz.get_visualizations()) == [b_memory, a_reasoning, a_memory]
+    assert ids(viz.get_visualizations(agent_id="agent_a")) == [a_reasoning, a_memory]
+    assert ids(viz.get_visualizations(viz_type="memory")) == [b_memory, a_memory]
+    assert ids(viz.get_visualizations(agent_id="agent_a", viz_type="reasoning")) == [a_reasoning]
+    assert viz.get_visualizations(agent_id="missing") == []
+    assert viz.get_visualizations(viz_type="missing") == []
+    
+    memory_viz = viz.get_visualizations(agent_id="agent_b", viz_type="memory")[0]
+    assert memory_viz["memory_stats"]["total_items"] == 3
+    assert [fact["id"] for fact in memory_viz["facts"]] == ["fact_1"]
+
+def test_limit_returns_most_recent(tmp_path):
+    viz = ADEVisualization(str(tmp_path))
+    saved = [save_memory(viz, "agent_a") for _ in range(5)]
+    
+    assert ids(viz.get_visualizations(limit=2)) == saved[::-1][:2]
+    assert ids(viz.get_visualizations(agent_id="agent_a", limit=10)) == saved[::-1]
+    assert viz.get_visualizations(limit=0) == []
+
+def test_cache_invalidated_by_saves(tmp_path):
+    viz = ADEVisualization(str(tmp_path))
+    first = save_memory(viz, "agent_a")
+    assert ids(viz.get_visualizations()) == [first]
+    
+    # Saved through the same service
+    second = save_memory(viz, "agent_a")
+    assert ids(viz.get_visualizations()) == [second, first]
+    
+    # Saved by another writer, which only changes the directory on disk
+    time.sleep(0.02)
+    third = save_memory(ADEVisualization(str(tmp_path)), "agent_a")
+    assert ids(viz.get_visualizations()) == [third, second, first]
+    
+    # Appended to a batch log by another writer
+    batch = ADEVisualization(str(tmp_path), batch=True)
+    logged = save_memory(batch, "agent_a")
+    batch.flush()
+    assert ids(viz.get_visualizations()) == [logged, third, second, first]
+    batch.close()
+
+def test_reads_json_msgpack_and_batch_logs(tmp_path):
+    json_id = save_memory(ADEVisualization(str(tmp_path)), "agent_a")
+    msgpack_id = save_memory(ADEVisualization(str(tmp_path), format="msgpack"), "agent_a")
+    batch = ADEVisualization(str(tmp_path), batch=True)
+    logged_ids = [save_memory(batch, "agent_a"), save_reasoning(batch, "agent_a")]
+    batch.close()
+    
+    agent_dir = tmp_path / "memory" / "agent_a"
+    assert sorted(path.suffix for path in agent_dir.iterdir()) == [".json", ".jsonl", ".msgpack"]
+    
+    visualizations = ADEVisualization(str(tmp_path)).get_visualizations()
+    assert ids(visualizations) == [logged_ids[1], logged_ids[0], msgpack_id, json_id]
+    for visualization in visualizations:
+        if "memory_stats" in visualization:
+            assert visualization["memory_stats"]["total_items"] == 3
+            assert [conv["id"] for conv in visualization["conversations"]] == ["conv_1"]
+
+def test_migrates_flat_files_from_older_versions(tmp_path):
+    legacy = {
+        "agent_id": "agent_a",
+        "visualization_id": "legacy",
+        "created_at": "2024-01-01T00:00:00"
+    }
+    (tmp_path / "memory_legacy.json").write_bytes(orjson.dumps(legacy))
+    
+    viz = ADEVisualization(str(tmp_path))
+    assert not (tmp_path / "memory_legacy.json").exists()
+    assert (tmp_path / "memory" / "agent_a" / "legacy.json").exists()
+    
+    # Older files only have the ISO created_at, and sort before newer ones
+    newer = save_memory(viz, "agent_a")
+    assert ids(viz.get_visualizations(agent_id="agent_a", viz_type="memory")) == [newer, "legacy"]
\ No newline at end of file